@@ -0,0 +1,20 @@
+# Generated manually on 2026-10-15
+# Add composite index on answers (user, problem, -created_at) for latest-answer lookups.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("problems", "0006_add_missing_models"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="answer",
+            index=models.Index(
+                fields=["user", "problem", "-created_at"],
+                name="answers_user_problem_created",
+            ),
+        ),
+    ]
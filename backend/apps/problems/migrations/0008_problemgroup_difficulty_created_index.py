@@ -0,0 +1,20 @@
+# Generated manually on 2026-10-15
+# Add composite index on problem_groups (difficulty, created_at) for stock counts and serving.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("problems", "0007_answer_user_problem_created_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="problemgroup",
+            index=models.Index(
+                fields=["difficulty", "created_at"],
+                name="problem_groups_diff_created",
+            ),
+        ),
+    ]
@@ -39,6 +39,13 @@ class ProblemGroup(models.Model):
                 name="problem_groups_difficulty_valid",
             ),
         ]
+        indexes = [
+            # 難易度ごとの在庫集計と、最古の問題グループの取得（ORDER BY created_at）用
+            models.Index(
+                fields=["difficulty", "created_at"],
+                name="problem_groups_diff_created",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.title} ({self.difficulty})"
@@ -138,6 +145,13 @@ class Answer(models.Model):
                 name="answers_grade_valid",
             ),
         ]
+        indexes = [
+            # ユーザー×小問ごとの最新回答の取得（DISTINCT ON / ORDER BY created_at DESC）用
+            models.Index(
+                fields=["user", "problem", "-created_at"],
+                name="answers_user_problem_created",
+            ),
+        ]
 
     def __str__(self) -> str:
         grade_display = self.get_grade_display()
@@ -1,4 +1,16 @@
-def build_problem_generation_prompt(difficulty: str) -> str:
+from typing import NamedTuple
+
+
+class BatchGradingItem(NamedTuple):
+    """一括採点プロンプトに埋め込む1問分の問題と回答"""
+
+    order_index: int
+    problem_type: str
+    problem_body: str
+    answer_body: str
+
+
+def _render_problem_generation_prompt(difficulty: str) -> str:
     """
     問題生成用のプロンプトを構築する（難易度のみ指定、mode=both固定）
 
@@ -192,7 +204,32 @@ API問題は機能ごとに分けて生成してください。
     return prompt
 
 
-def build_grading_prompt(problem_type: str, problem_body: str, answer_body: str) -> str:
+# 難易度は3種類しかないため、プロンプトはimport時に生成しておき辞書引きで返す
+_PROBLEM_GENERATION_PROMPTS = {
+    difficulty: _render_problem_generation_prompt(difficulty)
+    for difficulty in ("easy", "medium", "hard")
+}
+
+
+def build_problem_generation_prompt(difficulty: str) -> str:
+    """
+    問題生成用のプロンプトを取得する（事前生成済みのものを返す）
+
+    Args:
+        difficulty: 難易度 (easy/medium/hard)
+
+    Returns:
+        Gemini API に投げるプロンプト文字列（問題 + 模範解答を含む）
+    """
+    prompt = _PROBLEM_GENERATION_PROMPTS.get(difficulty)
+    if prompt is None:
+        prompt = _render_problem_generation_prompt(difficulty)
+    return prompt
+
+
+def _render_grading_prompt(
+    problem_type: str, problem_body: str, answer_body: str
+) -> str:
     """
     採点用のプロンプトを構築する
 
@@ -282,35 +319,66 @@ def build_grading_prompt(problem_type: str, problem_body: str, answer_body: str)
     return prompt
 
 
-def build_batch_grading_prompt(problems_with_answers: list[dict]) -> str:
+# 問題文・回答を差し込む位置の目印（プロンプト本文には現れない制御文字で囲む）
+_PROBLEM_BODY_SLOT = "\x00problem_body\x00"
+_ANSWER_BODY_SLOT = "\x00answer_body\x00"
+_PROBLEMS_SECTION_SLOT = "\x00problems_section\x00"
+
+
+def _split_grading_prompt(problem_type: str) -> tuple[str, str, str]:
+    """採点プロンプトを問題文・回答の前後の固定部分に分割する"""
+    rendered = _render_grading_prompt(
+        problem_type, _PROBLEM_BODY_SLOT, _ANSWER_BODY_SLOT
+    )
+    head, rest = rendered.split(_PROBLEM_BODY_SLOT)
+    middle, tail = rest.split(_ANSWER_BODY_SLOT)
+    return head, middle, tail
+
+
+_GRADING_PROMPT_PARTS = {
+    problem_type: _split_grading_prompt(problem_type) for problem_type in ("db", "api")
+}
+
+
+def build_grading_prompt(problem_type: str, problem_body: str, answer_body: str) -> str:
+    """
+    採点用のプロンプトを構築する（固定部分は事前生成済み）
+
+    Args:
+        problem_type: 問題タイプ (db/api)
+        problem_body: 問題本文
+        answer_body: ユーザーの回答
+
+    Returns:
+        Gemini API に投げるプロンプト文字列
+    """
+    parts = _GRADING_PROMPT_PARTS.get(problem_type)
+    if parts is None:
+        parts = _split_grading_prompt(problem_type)
+    head, middle, tail = parts
+    return "".join((head, problem_body, middle, answer_body, tail))
+
+
+def build_batch_grading_prompt(problems_with_answers: list[BatchGradingItem]) -> str:
     """
     一括採点用のプロンプトを構築する
 
     Args:
         problems_with_answers: 問題と回答のペアリスト
-            [
-                {
-                    "order_index": 1,
-                    "problem_type": "db",
-                    "problem_body": "問題文",
-                    "answer_body": "回答"
-                },
-                ...
-            ]
 
     Returns:
         Gemini API に投げるプロンプト文字列
     """
 
-    problems_section = ""
+    sections = []
     for item in problems_with_answers:
-        order_index = item["order_index"]
-        problem_type = item["problem_type"]
+        order_index = item.order_index
+        problem_type = item.problem_type
         problem_type_name = "データベース設計" if problem_type == "db" else "API設計"
-        problem_body = item["problem_body"]
-        answer_body = item["answer_body"]
+        problem_body = item.problem_body
+        answer_body = item.answer_body
 
-        problems_section += f"""
+        sections.append(f"""
 ---
 ## 問題 {order_index}（{problem_type_name}問題）
 
@@ -320,8 +388,13 @@ def build_batch_grading_prompt(problems_with_answers: list[dict]) -> str:
 ### 受講者の回答
 {answer_body}
 
-"""
+""")
+
+    return "".join((_BATCH_GRADING_PROMPT_HEAD, *sections, _BATCH_GRADING_PROMPT_TAIL))
+
 
+def _render_batch_grading_prompt(problems_section: str) -> str:
+    """一括採点プロンプトの全文を組み立てる（固定部分の事前生成用）"""
     prompt = f"""あなたは経験豊富なバックエンドエンジニアで、データベース設計・API設計問題の採点を行う専門家です。
 
 必ず日本語で回答してください。
@@ -398,3 +471,9 @@ def build_batch_grading_prompt(problems_with_answers: list[dict]) -> str:
 """
 
     return prompt
+
+
+# 一括採点プロンプトの固定部分（採点対象セクションの前後）
+_BATCH_GRADING_PROMPT_HEAD, _BATCH_GRADING_PROMPT_TAIL = _render_batch_grading_prompt(
+    _PROBLEMS_SECTION_SLOT
+).split(_PROBLEMS_SECTION_SLOT)
@@ -73,6 +73,29 @@ def get_period_start(period: Period) -> Optional[datetime]:
         return None
 
 
+def get_period_end(period: Period) -> Optional[datetime]:
+    """
+    期間の終了日時（次の期間の開始日時）を取得する
+
+    Args:
+        period: 集計期間
+
+    Returns:
+        終了日時（ALLの場合はNone）
+    """
+    period_start = get_period_start(period)
+
+    if period == Period.DAILY:
+        return period_start + timedelta(days=1)
+    elif period == Period.WEEKLY:
+        return period_start + timedelta(days=7)
+    elif period == Period.MONTHLY:
+        # 翌月の1日の0時0分0秒
+        return (period_start + timedelta(days=32)).replace(day=1)
+    else:
+        return None
+
+
 def get_ranking(
     period: Period = Period.DAILY,
     score_type: ScoreType = ScoreType.PROBLEM_COUNT,
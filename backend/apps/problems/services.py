@@ -1,12 +1,17 @@
+import hashlib
 import json
 import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, TypedDict, Optional, List, Tuple, Dict
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import transaction
+from django.core.cache import cache
+from django.db import connections, transaction
 
 from common.ai.gemini_client import GeminiClient, GeminiClientError
 from .models import ProblemGroup, Problem
 from .prompts import (
+    BatchGradingItem,
     build_problem_generation_prompt,
     build_grading_prompt,
     build_batch_grading_prompt,
@@ -15,12 +20,90 @@ from .prompts import (
 User = get_user_model()
 
 
-def _fix_unescaped_newlines(json_str: str) -> str:
-    return json_str
+# 必須項目の定義（キー, 空値を不可とするか）
+_PROBLEM_REQUIRED_FIELDS = (
+    ("problem_type", False),
+    ("order_index", False),
+    ("problem_body", False),
+)
+_MODEL_ANSWER_REQUIRED_FIELDS = (
+    ("order_index", False),
+    ("version", False),
+    ("model_answer", True),
+)
+_GRADING_RESULT_REQUIRED_FIELDS = (
+    ("grade", False),
+    ("model_answer", True),
+    ("explanation", True),
+)
+
+
+_VALID_GRADES = frozenset((0, 1, 2))
+
+# 同一の問題・回答に対する採点結果を再利用する期間（秒）
+GRADE_CACHE_TIMEOUT = 3600
+
+# 採点結果キャッシュのバージョン
+# 採点プロンプト（prompts.build_grading_prompt）や採点結果の形式を変えたら上げる
+GRADE_CACHE_VERSION = 1
 
+# 改行・タブ以外の制御文字（C0 と DEL）を取り除く変換テーブル
+_CTRL_DROP = {c: None for c in range(32) if c not in (0x09, 0x0A)}
+_CTRL_DROP[0x7F] = None
 
-def _attempt_fix_incomplete_json(json_str: str) -> str:
-    return json_str
+
+def _find_missing_field(
+    data: Dict[str, Any], required_fields: Tuple[Tuple[str, bool], ...]
+) -> Optional[str]:
+    """必須項目のうち、欠けている（または空の）最初のキーを返す"""
+    for key, non_empty in required_fields:
+        if key not in data or (non_empty and not data[key]):
+            return key
+    return None
+
+
+def _grade_cache_key(
+    model: str, problem_type: str, problem_body: str, answer_body: str
+) -> str:
+    """
+    採点結果キャッシュのキー
+
+    モデル名・キャッシュバージョン・問題タイプ・問題文・サニタイズ済み回答のハッシュ。
+    モデルやプロンプトを変えた後に古い採点結果を返さないよう、モデル名とバージョンも含める。
+    """
+    digest = hashlib.blake2b(
+        "\x1e".join(
+            (
+                model,
+                str(GRADE_CACHE_VERSION),
+                problem_type,
+                problem_body,
+                answer_body,
+            )
+        ).encode(),
+        digest_size=16,
+    ).hexdigest()
+    return f"grade:{digest}"
+
+
+def _extract_json(response_text: str) -> str:
+    """
+    GeminiレスポンスはJSONのみを想定しているため、最小限の整形で返す。
+    - 先頭末尾にコードフェンスが両方付いていれば剥がす（簡易対応）
+    - それ以外はそのまま返す
+    """
+    # JSON モードではフェンスはまず付かないため、先頭がバッククォートでなければ
+    # 全体の strip によるコピーを省いてそのまま返す（前後の空白は JSON パーサが許容する）
+    if response_text[:64].lstrip()[:1] != "`":
+        return response_text
+
+    text = response_text.strip()
+    if text.startswith("```") and text.endswith("```"):
+        first_newline = text.find("\n")
+        if first_newline != -1:
+            text = text[first_newline + 1 :]
+        text = text.rsplit("```", 1)[0].strip()
+    return text
 
 
 class ProblemData(TypedDict):
@@ -113,14 +196,12 @@ class ProblemGenerator:
             raise ProblemGeneratorError(f"Gemini API呼び出しエラー: {e}") from e
 
         try:
-            json_str = self._extract_json_from_response(response_text)
+            json_str = _extract_json(response_text)
             generated_data: GeneratedProblemGroup = json.loads(json_str)
         except json.JSONDecodeError as e:
             raise ProblemGeneratorError(f"JSONパースエラー: {e}") from e
         except ValueError as e:
-            debug_snippet = (
-                response_text[:500] if len(response_text) > 500 else response_text
-            )
+            debug_snippet = response_text[:500]
             raise ProblemGeneratorError(
                 f"JSON抽出エラー: {e}\nレスポンス先頭: {debug_snippet}"
             ) from e
@@ -132,20 +213,44 @@ class ProblemGenerator:
             difficulty=difficulty,
         )
 
-    @staticmethod
-    def _extract_json_from_response(response_text: str) -> str:
+    def generate_batch(
+        self,
+        difficulty: str,
+        count: int,
+        max_workers: int = 8,
+    ) -> List[Tuple[Optional[ProblemGroup], Optional[List[Problem]], Dict[str, Any]]]:
         """
-        GeminiレスポンスはJSONのみを想定しているため、最小限の整形で返す。
-        - 先頭末尾にコードフェンスが両方付いていれば剥がす（簡易対応）
-        - それ以外はそのまま返す
+        問題を count 件並列に生成する（バッチ専用API）
+
+        Gemini 呼び出しが大半を占めるため、スレッドで並列化して
+        待ち時間を1件分程度に抑える。各問題グループは generate と同様に
+        個別のトランザクションで保存される。
+
+        Args:
+            difficulty: 難易度 (easy/medium/hard)
+            count: 生成する件数
+            max_workers: 同時に生成する件数の上限
+
+        Returns:
+            生成に成功した分の generate の戻り値リスト
+            （ProblemGeneratorError で失敗した分は含まない）
         """
-        text = response_text.strip()
-        if text.startswith("```") and text.rstrip().endswith("```"):
-            first_newline = text.find("\n")
-            if first_newline != -1:
-                text = text[first_newline + 1 :]
-            text = text.rsplit("```", 1)[0].strip()
-        return text
+        if count <= 0:
+            return []
+
+        def generate_one(_: int):
+            try:
+                return self.generate(difficulty)
+            except ProblemGeneratorError:
+                return None
+            finally:
+                # ワーカースレッドで開いた DB 接続はリクエスト終了時に閉じられないため明示的に閉じる
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=min(count, max_workers)) as executor:
+            results = list(executor.map(generate_one, range(count)))
+
+        return [result for result in results if result is not None]
 
     def _validate_generated_data(self, data: GeneratedProblemGroup) -> None:
         """
@@ -173,34 +278,29 @@ class ProblemGenerator:
                 f"問題数が不正です（期待: 2問以上, 実際: {problem_count}）"
             )
 
+        # 必須項目チェックと種別の集計を1回の走査で行う
+        db_count = 0
+        api_count = 0
         for idx, problem in enumerate(data["problems"], start=1):
-            if "problem_type" not in problem:
-                raise ProblemGeneratorError(
-                    f"問題{idx}: problem_type が含まれていません"
-                )
-            if "order_index" not in problem:
+            missing = _find_missing_field(problem, _PROBLEM_REQUIRED_FIELDS)
+            if missing is not None:
+                raise ProblemGeneratorError(f"問題{idx}: {missing} が含まれていません")
+
+            problem_type = problem["problem_type"]
+            if problem_type == "db":
+                db_count += 1
+            elif problem_type == "api":
+                api_count += 1
+            else:
                 raise ProblemGeneratorError(
-                    f"問題{idx}: order_index が含まれていません"
-                )
-            if "problem_body" not in problem:
-                raise ProblemGeneratorError(
-                    f"問題{idx}: problem_body が含まれていません"
+                    f"問題{idx}: problem_type が不正です（{problem_type}）"
                 )
 
-            if problem["problem_type"] not in ["db", "api"]:
+            if idx == 1 and problem_type != "db":
                 raise ProblemGeneratorError(
-                    f"問題{idx}: problem_type が不正です（{problem['problem_type']}）"
+                    f"mode=both では最初の問題は DB 設計である必要があります（実際: {problem_type}）"
                 )
 
-        problem_types = [p["problem_type"] for p in data["problems"]]
-        if problem_types[0] != "db":
-            raise ProblemGeneratorError(
-                f"mode=both では最初の問題は DB 設計である必要があります（実際: {problem_types[0]}）"
-            )
-
-        db_count = problem_types.count("db")
-        api_count = problem_types.count("api")
-
         if db_count != 1:
             raise ProblemGeneratorError(
                 f"mode=both では DB 設計問題は1問である必要があります（実際: {db_count}問）"
@@ -212,24 +312,16 @@ class ProblemGenerator:
             )
 
         for idx, model_answer in enumerate(data["model_answers"], start=1):
-            if "order_index" not in model_answer:
+            missing = _find_missing_field(model_answer, _MODEL_ANSWER_REQUIRED_FIELDS)
+            if missing is not None:
                 raise ProblemGeneratorError(
-                    f"模範解答{idx}: order_index が含まれていません"
-                )
-            if "version" not in model_answer:
-                raise ProblemGeneratorError(
-                    f"模範解答{idx}: version が含まれていません"
-                )
-            if "model_answer" not in model_answer or not model_answer["model_answer"]:
-                raise ProblemGeneratorError(
-                    f"模範解答{idx}: model_answer が含まれていません"
+                    f"模範解答{idx}: {missing} が含まれていません"
                 )
             if model_answer["version"] != 1:
                 raise ProblemGeneratorError(
                     f"模範解答{idx}: version は 1 である必要があります（実際: {model_answer['version']}）"
                 )
 
-    @transaction.atomic
     def _save_to_db(
         self,
         generated_data: GeneratedProblemGroup,
@@ -247,36 +339,38 @@ class ProblemGenerator:
         """
         from .models import ModelAnswer
 
-        problem_group = ProblemGroup.objects.create(
-            title=generated_data["title"],
-            description=generated_data["description"],
-            difficulty=difficulty,
-        )
-
-        problems = []
-        problem_id_by_order = {}
-        for problem_data in generated_data["problems"]:
-            problem = Problem.objects.create(
-                problem_group=problem_group,
-                problem_type=problem_data["problem_type"],
-                order_index=problem_data["order_index"],
-                problem_body=problem_data["problem_body"],
+        # 書き込みだけをトランザクションに含め、レスポンス構築中はトランザクションを開いたままにしない
+        with transaction.atomic():
+            problem_group = ProblemGroup.objects.create(
+                title=generated_data["title"],
+                description=generated_data["description"],
+                difficulty=difficulty,
             )
-            problems.append(problem)
-            problem_id_by_order[problem.order_index] = problem.problem_id
 
-        model_answers = []
-        for ma_data in generated_data["model_answers"]:
-            problem = next(
-                (p for p in problems if p.order_index == ma_data["order_index"]), None
-            )
-            if problem:
-                model_answer = ModelAnswer.objects.create(
-                    problem=problem,
+            # PostgreSQL では bulk_create が INSERT ... RETURNING で problem_id を埋めるため、
+            # 小問数に関わらず1往復で保存でき、後続のレスポンス構築で再取得も不要
+            problems = [
+                Problem(
+                    problem_group=problem_group,
+                    problem_type=problem_data["problem_type"],
+                    order_index=problem_data["order_index"],
+                    problem_body=problem_data["problem_body"],
+                )
+                for problem_data in generated_data["problems"]
+            ]
+            Problem.objects.bulk_create(problems)
+
+            problems_by_order = {p.order_index: p for p in problems}
+            model_answers = [
+                ModelAnswer(
+                    problem=problems_by_order[ma_data["order_index"]],
                     version=ma_data["version"],
                     model_answer=ma_data["model_answer"],
                 )
-                model_answers.append(model_answer)
+                for ma_data in generated_data["model_answers"]
+                if ma_data["order_index"] in problems_by_order
+            ]
+            ModelAnswer.objects.bulk_create(model_answers)
 
         response_data = {
             "kind": "persisted",
@@ -299,7 +393,7 @@ class ProblemGenerator:
             ],
             "model_answers": [
                 {
-                    "problem_id": ma.problem.problem_id,
+                    "problem_id": ma.problem_id,
                     "version": ma.version,
                     "model_answer": ma.model_answer,
                 }
@@ -341,6 +435,29 @@ class AnswerGrader:
         """
         answer_body = self._sanitize_answer(answer_body)
 
+        # 再送信・二重送信では同じ採点結果を返し、Gemini 呼び出しを省く
+        cache_key = _grade_cache_key(
+            self.gemini_client.model, problem_type, problem_body, answer_body
+        )
+        cached_result = cache.get(cache_key)
+        if cached_result is not None:
+            return cached_result
+
+        grading_result = self._request_grading(problem_type, problem_body, answer_body)
+
+        cache.set(cache_key, grading_result, timeout=GRADE_CACHE_TIMEOUT)
+
+        return grading_result
+
+    def _request_grading(
+        self, problem_type: str, problem_body: str, answer_body: str
+    ) -> GradingResult:
+        """
+        サニタイズ済みの回答を Gemini で1問だけ採点する
+
+        Raises:
+            AnswerGraderError: 採点に失敗した場合
+        """
         prompt = build_grading_prompt(problem_type, problem_body, answer_body)
 
         try:
@@ -354,14 +471,12 @@ class AnswerGrader:
         except GeminiClientError as e:
             raise AnswerGraderError(f"Gemini API呼び出しエラー: {e}") from e
         try:
-            json_str = self._extract_json_from_response(response_text)
+            json_str = _extract_json(response_text)
             grading_result: GradingResult = json.loads(json_str)
         except json.JSONDecodeError as e:
             raise AnswerGraderError(f"JSONパースエラー: {e}") from e
         except ValueError as e:
-            debug_snippet = (
-                response_text[:500] if len(response_text) > 500 else response_text
-            )
+            debug_snippet = response_text[:500]
             raise AnswerGraderError(
                 f"JSON抽出エラー: {e}\nレスポンス先頭: {debug_snippet}"
             ) from e
@@ -388,29 +503,7 @@ class AnswerGrader:
             サニタイズされたテキスト
         """
         text = unicodedata.normalize("NFC", text)
-
-        cleaned = []
-        for char in text:
-            if ord(char) < 32 and char not in "\n\t":
-                continue
-            cleaned.append(char)
-
-        return "".join(cleaned)
-
-    @staticmethod
-    def _extract_json_from_response(response_text: str) -> str:
-        """
-        GeminiレスポンスはJSONのみを想定しているため、最小限の整形で返す。
-        - 先頭末尾にコードフェンスが両方付いていれば剥がす（簡易対応）
-        - それ以外はそのまま返す
-        """
-        text = response_text.strip()
-        if text.startswith("```") and text.rstrip().endswith("```"):
-            first_newline = text.find("\n")
-            if first_newline != -1:
-                text = text[first_newline + 1 :]
-            text = text.rsplit("```", 1)[0].strip()
-        return text
+        return text.translate(_CTRL_DROP)
 
     def _validate_grading_result(self, result: GradingResult) -> None:
         """
@@ -422,15 +515,12 @@ class AnswerGrader:
         Raises:
             AnswerGraderError: バリデーションエラー
         """
-        if "grade" not in result:
-            raise AnswerGraderError("grade が含まれていません")
-        if "model_answer" not in result or not result["model_answer"]:
-            raise AnswerGraderError("model_answer が含まれていません")
-        if "explanation" not in result or not result["explanation"]:
-            raise AnswerGraderError("explanation が含まれていません")
+        missing = _find_missing_field(result, _GRADING_RESULT_REQUIRED_FIELDS)
+        if missing is not None:
+            raise AnswerGraderError(f"{missing} が含まれていません")
 
         # grade の値チェック
-        if not isinstance(result["grade"], int) or result["grade"] not in [0, 1, 2]:
+        if not isinstance(result["grade"], int) or result["grade"] not in _VALID_GRADES:
             raise AnswerGraderError(
                 f"grade は 0, 1, 2 のいずれかである必要があります（実際: {result['grade']}）"
             )
@@ -461,18 +551,116 @@ class AnswerGrader:
             AnswerGraderError: 採点に失敗した場合
         """
         # 入力サニタイゼーション
-        sanitized_items = []
-        for item in problems_with_answers:
-            sanitized_items.append(
+        sanitize = self._sanitize_answer
+        sanitized_items = [
+            BatchGradingItem(
+                item["order_index"],
+                item["problem_type"],
+                item["problem_body"],
+                sanitize(item["answer_body"]),
+            )
+            for item in problems_with_answers
+        ]
+
+        # キャッシュ済みの採点結果を再利用し、未採点の問題だけを Gemini に送る
+        model = self.gemini_client.model
+        cache_keys = {
+            item.order_index: _grade_cache_key(
+                model, item.problem_type, item.problem_body, item.answer_body
+            )
+            for item in sanitized_items
+        }
+        cached_results = cache.get_many(cache_keys.values())
+
+        results_by_index: Dict[int, BatchGradingResult] = {}
+        pending_items = []
+        for item in sanitized_items:
+            cached = cached_results.get(cache_keys[item.order_index])
+            if cached is None:
+                pending_items.append(item)
+                continue
+            results_by_index[item.order_index] = {
+                "order_index": item.order_index,
+                "grade": cached["grade"],
+                "model_answer": cached["model_answer"],
+                "explanation": cached["explanation"],
+            }
+
+        if pending_items:
+            concurrency = getattr(settings, "GRADER_CONCURRENCY", 1)
+            if concurrency > 1 and len(pending_items) > 1:
+                graded_results = self._grade_items_concurrently(
+                    pending_items, concurrency
+                )
+            else:
+                graded_results = self._request_batch_grading(pending_items)
+            cache.set_many(
                 {
-                    "order_index": item["order_index"],
-                    "problem_type": item["problem_type"],
-                    "problem_body": item["problem_body"],
-                    "answer_body": self._sanitize_answer(item["answer_body"]),
-                }
+                    cache_keys[r["order_index"]]: {
+                        "grade": r["grade"],
+                        "model_answer": r["model_answer"],
+                        "explanation": r["explanation"],
+                    }
+                    for r in graded_results
+                },
+                timeout=GRADE_CACHE_TIMEOUT,
             )
+            for r in graded_results:
+                results_by_index[r["order_index"]] = r
+
+        return [results_by_index[i] for i in sorted(results_by_index)]
+
+    def _grade_items_concurrently(
+        self, items: List[BatchGradingItem], concurrency: int
+    ) -> List[BatchGradingResult]:
+        """
+        各問題を個別に Gemini へ並列で採点依頼する
 
-        prompt = build_batch_grading_prompt(sanitized_items)
+        一括採点では全問の模範解答・解説を1レスポンスで生成するため、
+        出力が長くなるほど待ち時間が伸びる。問題ごとに並列化すると
+        待ち時間は最も遅い1問分に収まる。
+
+        Args:
+            items: サニタイズ済みの問題と回答のペアリスト
+            concurrency: 同時に実行する採点リクエスト数の上限
+
+        Returns:
+            各問題の採点結果リスト
+
+        Raises:
+            AnswerGraderError: いずれかの問題の採点に失敗した場合
+        """
+
+        def grade_item(item: BatchGradingItem) -> BatchGradingResult:
+            result = self._request_grading(
+                item.problem_type, item.problem_body, item.answer_body
+            )
+            return {
+                "order_index": item.order_index,
+                "grade": result["grade"],
+                "model_answer": result["model_answer"],
+                "explanation": result["explanation"],
+            }
+
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(items))) as executor:
+            return list(executor.map(grade_item, items))
+
+    def _request_batch_grading(
+        self, items: List[BatchGradingItem]
+    ) -> List[BatchGradingResult]:
+        """
+        サニタイズ済みの問題と回答を Gemini で一括採点する
+
+        Args:
+            items: サニタイズ済みの問題と回答のペアリスト
+
+        Returns:
+            各問題の採点結果リスト（順不同）
+
+        Raises:
+            AnswerGraderError: 採点に失敗した場合
+        """
+        prompt = build_batch_grading_prompt(items)
 
         try:
             response_text = self.gemini_client.generate_content(
@@ -486,14 +674,12 @@ class AnswerGrader:
             raise AnswerGraderError(f"Gemini API呼び出しエラー: {e}") from e
 
         try:
-            json_str = self._extract_json_from_response(response_text)
+            json_str = _extract_json(response_text)
             parsed_response = json.loads(json_str)
         except json.JSONDecodeError as e:
             raise AnswerGraderError(f"JSONパースエラー: {e}") from e
         except ValueError as e:
-            debug_snippet = (
-                response_text[:500] if len(response_text) > 500 else response_text
-            )
+            debug_snippet = response_text[:500]
             raise AnswerGraderError(
                 f"JSON抽出エラー: {e}\nレスポンス先頭: {debug_snippet}"
             ) from e
@@ -511,10 +697,12 @@ class AnswerGrader:
         results = parsed_response["results"]
 
         validated_results: List[BatchGradingResult] = []
-        expected_indices = {item["order_index"] for item in problems_with_answers}
+        expected_indices = {item.order_index for item in items}
 
+        seen_indices = set()
         for result in results:
             self._validate_batch_grading_result(result, expected_indices)
+            seen_indices.add(result["order_index"])
             validated_results.append(
                 {
                     "order_index": result["order_index"],
@@ -524,15 +712,13 @@ class AnswerGrader:
                 }
             )
 
-        result_indices = {r["order_index"] for r in validated_results}
-        if result_indices != expected_indices:
-            missing = expected_indices - result_indices
+        # 個別バリデーションで想定外の order_index は弾いているため件数比較で十分
+        if len(seen_indices) != len(expected_indices):
+            missing = expected_indices - seen_indices
             raise AnswerGraderError(
                 f"採点結果に不足があります（不足: order_index {missing}）"
             )
 
-        validated_results.sort(key=lambda x: x["order_index"])
-
         return validated_results
 
     def _validate_batch_grading_result(
@@ -554,21 +740,18 @@ class AnswerGrader:
             raise AnswerGraderError(
                 f"order_index は整数である必要があります（実際: {result['order_index']}）"
             )
-
-        if "grade" not in result:
-            raise AnswerGraderError(
-                f"order_index {result['order_index']}: grade が含まれていません"
-            )
-        if "model_answer" not in result or not result["model_answer"]:
+        if result["order_index"] not in expected_indices:
             raise AnswerGraderError(
-                f"order_index {result['order_index']}: model_answer が含まれていません"
+                f"order_index {result['order_index']}: 採点対象に含まれない order_index です"
             )
-        if "explanation" not in result or not result["explanation"]:
+
+        missing = _find_missing_field(result, _GRADING_RESULT_REQUIRED_FIELDS)
+        if missing is not None:
             raise AnswerGraderError(
-                f"order_index {result['order_index']}: explanation が含まれていません"
+                f"order_index {result['order_index']}: {missing} が含まれていません"
             )
 
-        if not isinstance(result["grade"], int) or result["grade"] not in [0, 1, 2]:
+        if not isinstance(result["grade"], int) or result["grade"] not in _VALID_GRADES:
             raise AnswerGraderError(
                 f"order_index {result['order_index']}: grade は 0, 1, 2 のいずれかである必要があります（実際: {result['grade']}）"
             )
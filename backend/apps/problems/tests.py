@@ -1,3 +1,91 @@
-# from django.test import TestCase
+import json
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from .services import AnswerGrader, _grade_cache_key
+
+
+class _StubGeminiClient:
+    """generate_content の呼び出しを記録し、固定の一括採点結果を返すスタブ"""
+
+    model = "stub-model"
+
+    def __init__(self, results):
+        self.results = results
+        self.prompts = []
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return json.dumps({"results": self.results})
+
+
+@override_settings(GRADER_CONCURRENCY=1)
+class AnswerGraderGradeBatchTests(SimpleTestCase):
+    """AnswerGrader.grade_batch の採点結果キャッシュ"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_reuses_cached_result_and_grades_only_uncached_item(self):
+        cached_result = {
+            "grade": 2,
+            "model_answer": "キャッシュ済みの模範解答",
+            "explanation": "キャッシュ済みの解説",
+        }
+        cache.set(
+            _grade_cache_key("stub-model", "db", "ユーザー登録のテーブル設計", "回答1"),
+            cached_result,
+        )
+        client = _StubGeminiClient(
+            [
+                {
+                    "order_index": 2,
+                    "grade": 1,
+                    "model_answer": "模範解答2",
+                    "explanation": "解説2",
+                }
+            ]
+        )
+
+        results = AnswerGrader(gemini_client=client).grade_batch(
+            [
+                {
+                    "order_index": 1,
+                    "problem_type": "db",
+                    "problem_body": "ユーザー登録のテーブル設計",
+                    "answer_body": "回答1",
+                },
+                {
+                    "order_index": 2,
+                    "problem_type": "api",
+                    "problem_body": "投稿一覧取得のAPI設計",
+                    "answer_body": "回答2",
+                },
+            ]
+        )
+
+        self.assertEqual(
+            results,
+            [
+                {"order_index": 1, **cached_result},
+                {
+                    "order_index": 2,
+                    "grade": 1,
+                    "model_answer": "模範解答2",
+                    "explanation": "解説2",
+                },
+            ],
+        )
+        # キャッシュ済みの問題は Gemini に送らない
+        self.assertEqual(len(client.prompts), 1)
+        self.assertNotIn("ユーザー登録のテーブル設計", client.prompts[0])
+        self.assertIn("投稿一覧取得のAPI設計", client.prompts[0])
+        # 新しく採点した結果はキャッシュされる
+        self.assertEqual(
+            cache.get(
+                _grade_cache_key("stub-model", "api", "投稿一覧取得のAPI設計", "回答2")
+            ),
+            {"grade": 1, "model_answer": "模範解答2", "explanation": "解説2"},
+        )
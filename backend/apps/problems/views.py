@@ -3,7 +3,25 @@
 """
 
 import secrets
-from django.db import transaction
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Avg,
+    Count,
+    Exists,
+    Max,
+    OuterRef,
+    Prefetch,
+    Q,
+    Subquery,
+    Sum,
+)
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -22,15 +40,184 @@ from common.error_codes import ErrorCode
 
 from .services import (
     ProblemGenerator,
-    ProblemGeneratorError,
     AnswerGrader,
     AnswerGraderError,
 )
-from .models import ProblemGroup, Problem, Answer, Explanation, ModelAnswer
-from .ranking_service import get_ranking, Period, ScoreType
+from .models import (
+    ProblemGroup,
+    Problem,
+    Answer,
+    Explanation,
+    ModelAnswer,
+    ProblemGroupAttempt,
+)
+from .ranking_service import get_ranking, get_period_end, Period, ScoreType
+
+# PostgreSQL固有のエラー（FK 制約違反の判定に使う）
+try:
+    from psycopg import errors as pg_errors
+except ImportError:
+    pg_errors = None
 
 MAX_ANSWER_BODY_LENGTH = 50000
 
+# 採点結果（0/1/2）の表示記号
+GRADE_DISPLAY_MAP = {0: "×", 1: "△", 2: "○"}
+
+DIFFICULTIES = ("easy", "medium", "hard")
+_VALID_DIFFICULTIES = frozenset(DIFFICULTIES)
+
+# ゲスト向け問題グループのレスポンス用データのキャッシュ有効期間（秒）
+GUEST_PROBLEM_GROUP_CACHE_TIMEOUT = 60
+
+# ダッシュボードのレスポンス用データのキャッシュ有効期間（秒）。回答時に削除せず、この期限でのみ更新する
+DASHBOARD_CACHE_TIMEOUT = 60
+
+# ランキングのキャッシュ有効期間（秒）。期間の切り替わりを越えてキャッシュしない
+RANKING_CACHE_TIMEOUT = 60
+
+
+_problem_generator: Optional[ProblemGenerator] = None
+
+
+def _get_problem_generator() -> ProblemGenerator:
+    """
+    プロセス内で共有する ProblemGenerator を取得する（初回呼び出し時に生成）
+
+    GeminiClient の生成（HTTP クライアントの作成）をリクエストごとに行わないようにする。
+    ProblemGenerator は状態を持たないため、スレッド間で共有してよい。
+    """
+    global _problem_generator
+    if _problem_generator is None:
+        _problem_generator = ProblemGenerator()
+    return _problem_generator
+
+
+def _dashboard_cache_key(user_id: int) -> str:
+    """ダッシュボードのキャッシュキー（ユーザーごと）"""
+    return f"dashboard:{user_id}"
+
+
+def _problem_group_exists(problem_group_id: int) -> bool:
+    """題材が存在するか（EXISTS の1クエリ）"""
+    return ProblemGroup.objects.filter(problem_group_id=problem_group_id).exists()
+
+
+def _problem_group_not_found(problem_group_id: int) -> NotFoundError:
+    """題材が存在しない場合の例外"""
+    return NotFoundError(
+        error_code=ErrorCode.PROBLEM_GROUP_NOT_FOUND,
+        message=f"問題グループID {problem_group_id} が見つかりません",
+    )
+
+
+def _get_problem_group_with_problems(
+    problem_group_ids,
+) -> tuple[Optional[ProblemGroup], list[Problem]]:
+    """
+    問題グループとその小問を1クエリで取得する
+
+    小問側から problem_group を JOIN して取得するため、
+    問題グループ単体の SELECT が不要になる（問題グループには必ず小問がある）。
+
+    Args:
+        problem_group_ids: 問題グループIDのリスト、または1件に絞ったサブクエリ
+
+    Returns:
+        (ProblemGroupインスタンス, order_index 順の Problem リスト)
+        見つからない場合は (None, [])
+    """
+    problems = list(
+        Problem.objects.filter(problem_group_id__in=problem_group_ids)
+        .select_related("problem_group")
+        .order_by("order_index")
+    )
+    if not problems:
+        return None, []
+    return problems[0].problem_group, problems
+
+
+def _get_guest_problem_group_payload(difficulty: str) -> Optional[dict]:
+    """
+    ゲストに配信する問題グループ（難易度ごとに最古のもの）のレスポンス用データを取得する
+
+    ゲストには全員同じ問題グループを配信するため、難易度ごとに短時間キャッシュする。
+
+    Args:
+        difficulty: 難易度
+
+    Returns:
+        {"problem_group": {...}, "problems": [...]}
+        在庫が無い場合は None（キャッシュしない）
+    """
+    cache_key = f"guest_problem_group:{difficulty}"
+    payload = cache.get(cache_key)
+    if payload is not None:
+        return payload
+
+    problem_group, problems = _get_problem_group_with_problems(
+        ProblemGroup.objects.filter(difficulty=difficulty)
+        .order_by("created_at")
+        .values("problem_group_id")[:1]
+    )
+    if problem_group is None:
+        return None
+
+    payload = {
+        "problem_group": {
+            "problem_group_id": problem_group.problem_group_id,
+            "title": problem_group.title,
+            "description": problem_group.description,
+            "difficulty": problem_group.difficulty,
+        },
+        "problems": [
+            {
+                "problem_id": p.problem_id,
+                "problem_group_id": problem_group.problem_group_id,
+                "order_index": p.order_index,
+                "problem_type": p.problem_type,
+                "problem_body": p.problem_body,
+            }
+            for p in problems
+        ],
+    }
+    cache.set(cache_key, payload, timeout=GUEST_PROBLEM_GROUP_CACHE_TIMEOUT)
+    return payload
+
+
+def _get_problems_for_grading(problem_group_id) -> list[Problem]:
+    """
+    採点に使う小問を、最新バージョンの模範解答付きで1クエリで取得する
+
+    模範解答は (problem, version) のユニーク制約のインデックスを使う
+    相関サブクエリで最新1件だけを取り出し、以下の属性として付与する。
+    模範解答が無い小問ではどちらも None になる。
+    - latest_model_answer_version
+    - latest_model_answer
+
+    Args:
+        problem_group_id: 問題グループID
+
+    Returns:
+        order_index 順の Problem リスト（採点で使う列のみ）
+    """
+    latest_model_answers = ModelAnswer.objects.filter(
+        problem_id=OuterRef("problem_id")
+    ).order_by("-version")
+    return list(
+        Problem.objects.filter(problem_group_id=problem_group_id)
+        .only("problem_id", "order_index", "problem_type", "problem_body")
+        .annotate(
+            latest_model_answer_version=Subquery(
+                latest_model_answers.values("version")[:1]
+            ),
+            latest_model_answer=Subquery(
+                latest_model_answers.values("model_answer")[:1]
+            ),
+        )
+        .order_by("order_index")
+    )
+
 
 class GenerateProblemView(APIView):
     """
@@ -75,8 +262,6 @@ class GenerateProblemView(APIView):
                 "error": null
             }
         """
-        from django.conf import settings
-        from .models import ProblemGroupAttempt
 
         batch_secret = request.headers.get("X-Batch-Secret", "")
         expected_secret = getattr(settings, "BATCH_SECRET_KEY", None)
@@ -88,48 +273,63 @@ class GenerateProblemView(APIView):
                 message="このAPIはバッチ専用です。直接アクセスできません。"
             )
 
-        min_stock = request.data.get("min_stock", 5)
+        data = request.data
+        min_stock = data.get("min_stock", 5)
 
         if not isinstance(min_stock, int) or min_stock < 1:
             raise ValidationError(message="min_stock は1以上の整数を指定してください")
 
         # リクエストボディから難易度を取得
-        difficulties_param = request.data.get("difficulties")
-        difficulty_param = request.data.get("difficulty")
+        difficulties_param = data.get("difficulties")
+        difficulty_param = data.get("difficulty")
 
         if difficulties_param is not None:
             if not isinstance(difficulties_param, list):
                 raise ValidationError(message="difficulties は配列で指定してください")
-            valid_difficulties = ["easy", "medium", "hard"]
-            if not all(d in valid_difficulties for d in difficulties_param):
+            # JSON の配列やオブジェクトはハッシュできないため、先に str か確認する
+            if not all(
+                isinstance(d, str) and d in _VALID_DIFFICULTIES
+                for d in difficulties_param
+            ):
                 raise ValidationError(
                     message="difficulties の要素は easy, medium, hard のいずれかを指定してください"
                 )
             difficulties = difficulties_param
         elif difficulty_param is not None:
-            if difficulty_param not in ["easy", "medium", "hard"]:
+            if (
+                not isinstance(difficulty_param, str)
+                or difficulty_param not in _VALID_DIFFICULTIES
+            ):
                 raise ValidationError(
                     message="difficulty は easy, medium, hard のいずれかを指定してください"
                 )
             difficulties = [difficulty_param]
         else:
             # デフォルト：全難易度を処理
-            difficulties = ["easy", "medium", "hard"]
+            difficulties = DIFFICULTIES
+
+        # 在庫数をカウント: 全問題数 - 解答済み問題数
+        # 難易度ごとの全問題数と、少なくとも1人以上が解答した問題グループ数を1クエリで集計する
+        stock_rows = (
+            ProblemGroup.objects.filter(difficulty__in=difficulties)
+            .order_by()
+            .values("difficulty")
+            .annotate(
+                total=Count("problem_group_id", distinct=True),
+                attempted=Count("attempts__problem_group_id", distinct=True),
+            )
+        )
+        stock_by_difficulty = {row["difficulty"]: row for row in stock_rows}
 
         results = []
         total_generated = 0
 
         for difficulty in difficulties:
-            # 在庫数をカウント: 全問題数 - 解答済み問題数
-            total_count = ProblemGroup.objects.filter(difficulty=difficulty).count()
-
-            # 少なくとも1人以上が解答した問題グループの数をカウント
-            attempted_count = (
-                ProblemGroupAttempt.objects.filter(problem_group__difficulty=difficulty)
-                .values("problem_group_id")
-                .distinct()
-                .count()
+            stock_row = stock_by_difficulty.setdefault(
+                difficulty, {"total": 0, "attempted": 0}
             )
+            total_count = stock_row["total"]
+            attempted_count = stock_row["attempted"]
 
             stock_count = total_count - attempted_count
 
@@ -137,16 +337,13 @@ class GenerateProblemView(APIView):
             shortage = max(0, min_stock - stock_count)
 
             if shortage > 0:
-                for _ in range(shortage):
-                    try:
-                        generator = ProblemGenerator()
-                        problem_group, problems, _ = generator.generate(
-                            difficulty=difficulty
-                        )
-                        generated_count += 1
-                        total_generated += 1
-                    except ProblemGeneratorError:
-                        continue
+                generated = _get_problem_generator().generate_batch(
+                    difficulty=difficulty, count=shortage
+                )
+                generated_count = len(generated)
+                total_generated += generated_count
+                # 同じ難易度が重複して指定された場合に再生成しないよう、生成分を在庫に反映する
+                stock_row["total"] += generated_count
 
             results.append(
                 {
@@ -198,28 +395,24 @@ class GetProblemGroupView(APIView):
                 "error": null
             }
         """
-        import secrets
-        from .models import ProblemGroupAttempt
 
         difficulty = request.query_params.get("difficulty")
 
-        if not difficulty or difficulty not in ["easy", "medium", "hard"]:
+        if difficulty not in _VALID_DIFFICULTIES:
             raise ValidationError(
                 message="difficulty は easy, medium, hard のいずれかを指定してください"
             )
 
+        session = request.session
+
         if request.user.is_authenticated:
             # 既に問題取得済みかチェック
-            if request.session.get("current_problem_group_id"):
-                problem_group_id = request.session.get("current_problem_group_id")
-                try:
-                    problem_group = ProblemGroup.objects.get(
-                        problem_group_id=problem_group_id
-                    )
-                    problems = list(
-                        problem_group.problems.all().order_by("order_index")
-                    )
-
+            problem_group_id = session.get("current_problem_group_id")
+            if problem_group_id:
+                problem_group, problems = _get_problem_group_with_problems(
+                    [problem_group_id]
+                )
+                if problem_group is not None:
                     return Response(
                         {
                             "data": {
@@ -245,19 +438,23 @@ class GetProblemGroupView(APIView):
                         },
                         status=status.HTTP_200_OK,
                     )
-                except ProblemGroup.DoesNotExist:
-                    # セッションのデータが無効な場合はクリアして新規生成に進む
-                    del request.session["current_problem_group_id"]
 
-            attempted_ids = ProblemGroupAttempt.objects.filter(
-                user=request.user
-            ).values_list("problem_group_id", flat=True)
+                # セッションのデータが無効な場合はクリアして新規生成に進む
+                del session["current_problem_group_id"]
 
-            problem_group = (
+            # 未挑戦の問題グループを NOT EXISTS（アンチジョイン）で絞り込む
+            problem_group, problems = _get_problem_group_with_problems(
                 ProblemGroup.objects.filter(difficulty=difficulty)
-                .exclude(problem_group_id__in=attempted_ids)
+                .filter(
+                    ~Exists(
+                        ProblemGroupAttempt.objects.filter(
+                            user=request.user,
+                            problem_group_id=OuterRef("problem_group_id"),
+                        )
+                    )
+                )
                 .order_by("created_at")
-                .first()
+                .values("problem_group_id")[:1]
             )
 
             if not problem_group:
@@ -266,9 +463,7 @@ class GetProblemGroupView(APIView):
                     message=f"難易度 {difficulty} の問題の上限に達しました。新しい問題を解くには時間をおいてから再度お試しください。",
                 )
 
-            request.session["current_problem_group_id"] = problem_group.problem_group_id
-
-            problems = list(problem_group.problems.all().order_by("order_index"))
+            session["current_problem_group_id"] = problem_group.problem_group_id
 
             return Response(
                 {
@@ -298,55 +493,41 @@ class GetProblemGroupView(APIView):
 
         # ゲストユーザーの場合
         else:
-            if request.session.get("guest_completed"):
+            if session.get("guest_completed"):
                 raise GuestLimitReachedError(
                     message="ゲストユーザーは1問のみ解くことができます。続けるには会員登録してください。"
                 )
 
-            if request.session.get("guest_problem_token"):
+            if session.get("guest_problem_token"):
                 raise GuestAlreadyGeneratedError(
                     message="ゲストユーザーは既に問題を取得済みです。先に回答を完了してください。"
                 )
 
-            problem_group = (
-                ProblemGroup.objects.filter(difficulty=difficulty)
-                .order_by("created_at")
-                .first()
-            )
+            payload = _get_guest_problem_group_payload(difficulty)
 
-            if not problem_group:
+            if payload is None:
                 raise NotFoundError(
                     error_code=ErrorCode.PROBLEM_NOT_FOUND,
                     message=f"難易度 {difficulty} の問題が在庫にありません。",
                 )
 
             guest_token = secrets.token_urlsafe(32)
-            request.session["guest_problem_token"] = guest_token
-            request.session["current_problem_group_id"] = problem_group.problem_group_id
-
-            problems = list(problem_group.problems.all().order_by("order_index"))
+            session.update(
+                {
+                    "guest_problem_token": guest_token,
+                    "current_problem_group_id": payload["problem_group"][
+                        "problem_group_id"
+                    ],
+                }
+            )
 
             return Response(
                 {
                     "data": {
                         "kind": "guest",
                         "guest_token": guest_token,
-                        "problem_group": {
-                            "problem_group_id": problem_group.problem_group_id,
-                            "title": problem_group.title,
-                            "description": problem_group.description,
-                            "difficulty": problem_group.difficulty,
-                        },
-                        "problems": [
-                            {
-                                "problem_id": p.problem_id,
-                                "problem_group_id": problem_group.problem_group_id,
-                                "order_index": p.order_index,
-                                "problem_type": p.problem_type,
-                                "problem_body": p.problem_body,
-                            }
-                            for p in problems
-                        ],
+                        "problem_group": payload["problem_group"],
+                        "problems": payload["problems"],
                     },
                     "error": None,
                 },
@@ -363,8 +544,6 @@ class GradeAnswerView(APIView):
     - ゲストユーザー: guest_token + answers 配列で全問を一括採点、保存しない
     """
 
-    GRADE_DISPLAY_MAP = {0: "×", 1: "△", 2: "○"}
-
     def post(self, request):
         """
         回答を一括採点する
@@ -405,11 +584,12 @@ class GradeAnswerView(APIView):
                 "error": null
             }
         """
-        problem_group_id = request.data.get("problem_group_id")
-        guest_token = request.data.get("guest_token")
-        answers = request.data.get("answers")
+        data = request.data
+        problem_group_id = data.get("problem_group_id")
+        guest_token = data.get("guest_token")
+        answers = data.get("answers")
 
-        if not answers or not isinstance(answers, list) or len(answers) == 0:
+        if not answers or not isinstance(answers, list):
             raise ValidationError(message="answers は1件以上の配列である必要があります")
 
         # XOR入力ルールチェック（problem_group_id と guest_token は排他）
@@ -435,7 +615,8 @@ class GradeAnswerView(APIView):
             if not has_guest_token:
                 raise ValidationError(message="ゲストユーザーは guest_token が必須です")
 
-            if request.session.get("guest_completed"):
+            session = request.session
+            if session.get("guest_completed"):
                 raise GuestLimitReachedError(
                     message="ゲストユーザーは1問のみ解くことができます。続けるには会員登録してください。"
                 )
@@ -458,10 +639,16 @@ class GradeAnswerView(APIView):
         Raises:
             ValidationError: バリデーションエラー
         """
-        key_field = "problem_id"
-        seen_keys = set()
+        # DRF の Serializer(many=True) は要素ごとにフィールドを生成・検証するため、
+        # 2 項目しかない回答にはこの単純なループの方が軽い
+        problem_ids = []
 
         for idx, answer in enumerate(answers):
+            if not isinstance(answer, dict):
+                raise ValidationError(
+                    message=f"answers[{idx}]: オブジェクトである必要があります"
+                )
+
             answer_body = answer.get("answer_body")
             if (
                 not answer_body
@@ -475,15 +662,21 @@ class GradeAnswerView(APIView):
                     message=f"answers[{idx}]: 回答は{MAX_ANSWER_BODY_LENGTH}文字以下である必要があります"
                 )
 
-            if answer.get("problem_id") is None:
+            problem_id = answer.get("problem_id")
+            if problem_id is None:
                 raise ValidationError(message=f"answers[{idx}]: problem_id は必須です")
 
-            key_value = answer.get(key_field)
-            if key_value in seen_keys:
-                raise ValidationError(
-                    message=f"answers[{idx}]: {key_field} が重複しています"
-                )
-            seen_keys.add(key_value)
+            problem_ids.append(problem_id)
+
+        # 重複は set の件数比較でまとめて検出し、該当時のみ位置を特定する
+        if len(set(problem_ids)) != len(problem_ids):
+            seen_problem_ids = set()
+            for idx, problem_id in enumerate(problem_ids):
+                if problem_id in seen_problem_ids:
+                    raise ValidationError(
+                        message=f"answers[{idx}]: problem_id が重複しています"
+                    )
+                seen_problem_ids.add(problem_id)
 
     def _handle_authenticated_user(self, request, problem_group_id: int, answers: list):
         """
@@ -503,35 +696,39 @@ class GradeAnswerView(APIView):
                 message="この題材は現在のセッションで進行中ではありません"
             )
 
-        try:
-            problem_group = ProblemGroup.objects.get(problem_group_id=problem_group_id)
-        except ProblemGroup.DoesNotExist:
+        # 採点で使う列と最新の模範解答だけを取得する
+        # 問題グループには必ず小問があるため、0件なら問題グループが存在しない
+        problems = _get_problems_for_grading(problem_group_id)
+        if not problems:
             raise NotFoundError(
                 error_code=ErrorCode.PROBLEM_NOT_FOUND,
                 message=f"問題グループID {problem_group_id} が見つかりません",
             )
 
-        problems = list(
-            Problem.objects.filter(problem_group=problem_group).order_by("order_index")
-        )
-
         problem_map = {p.problem_id: p for p in problems}
 
-        latest_model_answers = ModelAnswer.objects.filter(
-            problem__in=problems
-        ).order_by('problem_id', '-version').distinct('problem_id')
-        latest_model_answer_map = {ma.problem_id: ma for ma in latest_model_answers}
-
-        for answer in answers:
-            if answer["problem_id"] not in problem_map:
-                raise NotFoundError(
-                    error_code=ErrorCode.PROBLEM_NOT_FOUND,
-                    message=f"問題ID {answer['problem_id']} が見つかりません",
-                )
+        missing_ids = {answer["problem_id"] for answer in answers} - problem_map.keys()
+        if missing_ids:
+            # エラーメッセージはリクエスト順で最初に見つからなかった問題IDを示す
+            missing_id = next(
+                answer["problem_id"]
+                for answer in answers
+                if answer["problem_id"] in missing_ids
+            )
+            raise NotFoundError(
+                error_code=ErrorCode.PROBLEM_NOT_FOUND,
+                message=f"問題ID {missing_id} が見つかりません",
+            )
 
+        # 以降の保存・レスポンス構築はこのリストだけを参照する
+        # problems は order_index 順に取得済みのため、この順で組み立てれば
+        # 採点結果を後から並べ替える必要がない
+        answer_map = {answer["problem_id"]: answer for answer in answers}
         problems_with_answers = []
-        for answer in answers:
-            problem = problem_map[answer["problem_id"]]
+        for problem in problems:
+            answer = answer_map.get(problem.problem_id)
+            if answer is None:
+                continue
             problems_with_answers.append(
                 {
                     "order_index": problem.order_index,
@@ -550,50 +747,61 @@ class GradeAnswerView(APIView):
 
         result_map = {r["order_index"]: r for r in grading_results}
 
-        results = []
-        with transaction.atomic():
-            for item in problems_with_answers:
-                problem = problem_map[item["problem_id"]]
-                grading_result = result_map[item["order_index"]]
-
-                answer_record = Answer.objects.create(
-                    problem=problem,
-                    user=request.user,
-                    answer_body=item["answer_body"],
-                    grade=grading_result["grade"],
-                )
+        answer_records = [
+            Answer(
+                problem_id=item["problem_id"],
+                user=request.user,
+                answer_body=item["answer_body"],
+                grade=result_map[item["order_index"]]["grade"],
+            )
+            for item in problems_with_answers
+        ]
 
-                Explanation.objects.create(
-                    answer=answer_record,
-                    version=answer_record.version,
-                    explanation_body=grading_result["explanation"],
-                )
+        with transaction.atomic():
+            # PostgreSQL では INSERT ... RETURNING で answer_id が埋まるため、
+            # そのまま解説の外部キーとレスポンスに使える
+            Answer.objects.bulk_create(answer_records)
+            Explanation.objects.bulk_create(
+                [
+                    Explanation(
+                        answer=answer_record,
+                        version=answer_record.version,
+                        explanation_body=result_map[item["order_index"]]["explanation"],
+                    )
+                    for item, answer_record in zip(
+                        problems_with_answers, answer_records
+                    )
+                ]
+            )
 
-                model_answer_obj = latest_model_answer_map.get(problem.problem_id)
-                results.append(
-                    {
-                        "problem_ref": {
-                            "problem_id": problem.problem_id,
-                            "order_index": problem.order_index,
-                        },
-                        "problem_type": problem.problem_type,
-                        "grade": grading_result["grade"],
-                        "grade_display": self.GRADE_DISPLAY_MAP.get(
-                            grading_result["grade"], "×"
-                        ),
-                        "explanation": {
-                            "version": answer_record.version,
-                            "explanation_body": grading_result["explanation"],
-                        },
-                        "model_answer": {
-                            "version": model_answer_obj.version,
-                            "model_answer": model_answer_obj.model_answer,
-                        } if model_answer_obj else None,
-                        "answer_id": answer_record.answer_id,
+        results = []
+        for item, answer_record in zip(problems_with_answers, answer_records):
+            grading_result = result_map[item["order_index"]]
+            problem = problem_map[item["problem_id"]]
+            results.append(
+                {
+                    "problem_ref": {
+                        "problem_id": item["problem_id"],
+                        "order_index": item["order_index"],
+                    },
+                    "problem_type": item["problem_type"],
+                    "grade": grading_result["grade"],
+                    "grade_display": GRADE_DISPLAY_MAP.get(
+                        grading_result["grade"], "×"
+                    ),
+                    "explanation": {
+                        "version": answer_record.version,
+                        "explanation_body": grading_result["explanation"],
+                    },
+                    "model_answer": {
+                        "version": problem.latest_model_answer_version,
+                        "model_answer": problem.latest_model_answer,
                     }
-                )
-
-        results.sort(key=lambda x: x["problem_ref"]["order_index"])
+                    if problem.latest_model_answer_version is not None
+                    else None,
+                    "answer_id": answer_record.answer_id,
+                }
+            )
 
         return Response(
             {
@@ -615,7 +823,8 @@ class GradeAnswerView(APIView):
         Returns:
             Response: 採点結果のレスポンス
         """
-        session_token = request.session.get("guest_problem_token")
+        session = request.session
+        session_token = session.get("guest_problem_token")
         if not session_token:
             raise GuestSessionNotFoundError(
                 message="ゲストセッションが見つかりません。先に問題を生成してください。"
@@ -623,40 +832,43 @@ class GradeAnswerView(APIView):
         if session_token != guest_token:
             raise GuestTokenMismatchError(message="ゲストトークンが一致しません")
 
-        current_pg_id = request.session.get("current_problem_group_id")
+        current_pg_id = session.get("current_problem_group_id")
         if not current_pg_id:
             raise GuestSessionNotFoundError(
                 message="題材情報が見つかりません。先に問題を生成してください。"
             )
 
-        try:
-            problem_group = ProblemGroup.objects.get(problem_group_id=current_pg_id)
-        except ProblemGroup.DoesNotExist:
+        # 採点で使う列と最新の模範解答だけを取得する
+        # 問題グループには必ず小問があるため、0件なら問題グループが存在しない
+        problems = _get_problems_for_grading(current_pg_id)
+        if not problems:
             raise NotFoundError(
                 error_code=ErrorCode.PROBLEM_GROUP_NOT_FOUND,
                 message=f"問題グループID {current_pg_id} が見つかりません",
             )
-
-        problems = list(
-            Problem.objects.filter(problem_group=problem_group).order_by("order_index")
-        )
         problem_map = {p.problem_id: p for p in problems}
 
-        latest_model_answers = ModelAnswer.objects.filter(
-            problem__in=problems
-        ).order_by('problem_id', '-version').distinct('problem_id')
-        latest_model_answer_map = {ma.problem_id: ma for ma in latest_model_answers}
-
-        for answer in answers:
-            if answer["problem_id"] not in problem_map:
-                raise NotFoundError(
-                    error_code=ErrorCode.PROBLEM_NOT_FOUND,
-                    message=f"問題ID {answer['problem_id']} が見つかりません",
-                )
+        missing_ids = {answer["problem_id"] for answer in answers} - problem_map.keys()
+        if missing_ids:
+            # エラーメッセージはリクエスト順で最初に見つからなかった問題IDを示す
+            missing_id = next(
+                answer["problem_id"]
+                for answer in answers
+                if answer["problem_id"] in missing_ids
+            )
+            raise NotFoundError(
+                error_code=ErrorCode.PROBLEM_NOT_FOUND,
+                message=f"問題ID {missing_id} が見つかりません",
+            )
 
+        # problems は order_index 順に取得済みのため、この順で組み立てれば
+        # 採点結果を後から並べ替える必要がない
+        answer_map = {answer["problem_id"]: answer for answer in answers}
         problems_with_answers = []
-        for answer in answers:
-            problem = problem_map[answer["problem_id"]]
+        for problem in problems:
+            answer = answer_map.get(problem.problem_id)
+            if answer is None:
+                continue
             problems_with_answers.append(
                 {
                     "order_index": problem.order_index,
@@ -678,7 +890,7 @@ class GradeAnswerView(APIView):
         results = []
         for item in problems_with_answers:
             grading_result = result_map[item["order_index"]]
-            model_answer_obj = latest_model_answer_map.get(item["problem_id"])
+            problem = problem_map[item["problem_id"]]
 
             results.append(
                 {
@@ -688,7 +900,7 @@ class GradeAnswerView(APIView):
                     },
                     "problem_type": item["problem_type"],
                     "grade": grading_result["grade"],
-                    "grade_display": self.GRADE_DISPLAY_MAP.get(
+                    "grade_display": GRADE_DISPLAY_MAP.get(
                         grading_result["grade"], "×"
                     ),
                     "explanation": {
@@ -696,14 +908,14 @@ class GradeAnswerView(APIView):
                         "explanation_body": grading_result["explanation"],
                     },
                     "model_answer": {
-                        "version": model_answer_obj.version,
-                        "model_answer": model_answer_obj.model_answer,
-                    } if model_answer_obj else None,
+                        "version": problem.latest_model_answer_version,
+                        "model_answer": problem.latest_model_answer,
+                    }
+                    if problem.latest_model_answer_version is not None
+                    else None,
                 }
             )
 
-        results.sort(key=lambda x: x["problem_ref"]["order_index"])
-
         return Response(
             {
                 "data": {"results": results},
@@ -723,27 +935,32 @@ class CompleteProblemGroupView(APIView):
     """
 
     def post(self, request, problem_group_id: int):
-        from .models import ProblemGroupAttempt
-
-        try:
-            problem_group = ProblemGroup.objects.get(problem_group_id=problem_group_id)
-        except ProblemGroup.DoesNotExist:
-            raise NotFoundError(
-                error_code=ErrorCode.PROBLEM_GROUP_NOT_FOUND,
-                message=f"問題グループID {problem_group_id} が見つかりません",
-            )
-
         if request.user.is_authenticated:
             current_id = request.session.get("current_problem_group_id")
             if current_id != problem_group_id:
+                # 存在しない題材はセッションの状態に関わらず 404 を返す
+                if not _problem_group_exists(problem_group_id):
+                    raise _problem_group_not_found(problem_group_id)
                 raise PermissionDeniedError(
                     message="この題材は現在のセッションで進行中ではありません"
                 )
 
-            ProblemGroupAttempt.objects.get_or_create(
-                problem_group=problem_group,
-                user=request.user,
-            )
+            # INSERT ... ON CONFLICT DO NOTHING の1往復で upsert する
+            # 題材の存在確認は行わず、存在しない場合は FK 制約違反として検出する
+            try:
+                ProblemGroupAttempt.objects.bulk_create(
+                    [
+                        ProblemGroupAttempt(
+                            problem_group_id=problem_group_id,
+                            user=request.user,
+                        )
+                    ],
+                    ignore_conflicts=True,
+                )
+            except IntegrityError as e:
+                if pg_errors and isinstance(e.__cause__, pg_errors.ForeignKeyViolation):
+                    raise _problem_group_not_found(problem_group_id) from e
+                raise
 
             if "current_problem_group_id" in request.session:
                 del request.session["current_problem_group_id"]
@@ -753,6 +970,10 @@ class CompleteProblemGroupView(APIView):
                 {"data": {"ok": True}, "error": None}, status=status.HTTP_200_OK
             )
 
+        # ゲストは DB に書き込まないため、存在しない題材は明示的に確認して 404 を返す
+        if not _problem_group_exists(problem_group_id):
+            raise _problem_group_not_found(problem_group_id)
+
         guest_token = request.data.get("guest_token")
         if not guest_token:
             raise ValidationError(message="guest_token は必須です")
@@ -836,79 +1057,57 @@ class MyProblemGroupsView(APIView):
         filters = {}
 
         if difficulty:
-            if difficulty not in ["easy", "medium", "hard"]:
+            if difficulty not in _VALID_DIFFICULTIES:
                 raise ValidationError(
                     message="difficulty は easy, medium, hard のいずれかを指定してください"
                 )
             filters["difficulty"] = difficulty
 
-        from .models import ProblemGroupAttempt
-
-        attempted_ids = ProblemGroupAttempt.objects.filter(
-            user=request.user
-        ).values_list("problem_group_id", flat=True)
-        answered_ids = Answer.objects.filter(user=request.user).values_list(
-            "problem__problem_group_id", flat=True
-        )
-        target_ids = set(attempted_ids) | set(answered_ids)
-
-        if not target_ids:
-            return Response(
-                {
-                    "data": {
-                        "items": [],
-                        "next_cursor": None,
-                    },
-                    "error": None,
-                },
-                status=status.HTTP_200_OK,
+        # 完了済み or 解答済みの題材を、ID を Python に取り出さずサブクエリの OR で絞り込む
+        target_filter = Q(
+            problem_group_id__in=ProblemGroupAttempt.objects.filter(
+                user=request.user
+            ).values("problem_group_id")
+        ) | Q(
+            problem_group_id__in=Answer.objects.filter(user=request.user).values(
+                "problem__problem_group_id"
             )
-
-        from django.db.models import Max, Prefetch
+        )
 
         problem_groups_with_attempts = (
-            ProblemGroup.objects.filter(
-                problem_group_id__in=list(target_ids), **filters
-            )
+            ProblemGroup.objects.filter(target_filter, **filters)
+            .only("problem_group_id", "title", "description", "difficulty")
             .prefetch_related(
+                # 一覧では小問ごとの最新採点結果の突き合わせにしか使わないため ID だけ取得する
                 Prefetch(
                     "problems",
-                    queryset=Problem.objects.order_by("order_index")
-                ),
-                "attempts"
+                    queryset=Problem.objects.only(
+                        "problem_id", "problem_group_id"
+                    ).order_by("order_index"),
+                )
             )
             .annotate(attempt_date=Max("attempts__created_at"))
             .order_by("-attempt_date")
         )
 
-        all_problem_ids_set = set()
-        for pg in problem_groups_with_attempts:
-            all_problem_ids_set.update(p.problem_id for p in pg.problems.all())
-
+        problem_groups_with_attempts = list(problem_groups_with_attempts)
+        group_ids = [pg.problem_group_id for pg in problem_groups_with_attempts]
 
+        # 小問ごとの最新の回答（採点結果と回答日時）を DISTINCT ON で1クエリにまとめて取得する
+        # 題材ごとの最終回答日時は、所属する小問の最新回答日時の最大値として求める
         latest_answers = (
             Answer.objects.filter(
-                problem_id__in=list(all_problem_ids_set),
-                user=request.user
-            )
-            .order_by('problem_id', '-created_at')
-            .distinct('problem_id')
-        )
-
-        answer_map = {answer.problem_id: answer for answer in latest_answers}
-
-        latest_answer_dates = (
-            Answer.objects.filter(
-                problem__problem_group_id__in=list(target_ids),
-                user=request.user
+                problem__problem_group_id__in=group_ids, user=request.user
             )
-            .values('problem__problem_group_id')
-            .annotate(latest_created_at=Max('created_at'))
+            .order_by("problem_id", "-created_at")
+            .distinct("problem_id")
+            .values_list("problem_id", "grade", "created_at")
         )
-        answer_date_map = {
-            item['problem__problem_group_id']: item['latest_created_at']
-            for item in latest_answer_dates
-        }
+        latest_grade_map = {}
+        latest_date_map = {}
+        for problem_id, grade, created_at in latest_answers:
+            latest_grade_map[problem_id] = grade
+            latest_date_map[problem_id] = created_at
 
         items = []
         for pg in problem_groups_with_attempts:
@@ -917,17 +1116,19 @@ class MyProblemGroupsView(APIView):
 
             latest_grades = []
             answered_count = 0
+            latest_answer_date = None
             for problem in problems:
-                latest_answer = answer_map.get(problem.problem_id)
-                if latest_answer:
-                    latest_grades.append(latest_answer.grade)
+                latest_grade = latest_grade_map.get(problem.problem_id)
+                latest_grades.append(latest_grade)
+                if latest_grade is not None:
                     answered_count += 1
-                else:
-                    latest_grades.append(None)
+                    answer_date = latest_date_map[problem.problem_id]
+                    if latest_answer_date is None or answer_date > latest_answer_date:
+                        latest_answer_date = answer_date
 
             completion_date = pg.attempt_date
             if not completion_date:
-                completion_date = answer_date_map.get(pg.problem_group_id)
+                completion_date = latest_answer_date
 
             items.append(
                 {
@@ -987,45 +1188,74 @@ class ProblemGroupDetailView(APIView):
                 message="復習機能を利用するにはログインが必要です"
             )
 
-        try:
-            problem_group = ProblemGroup.objects.get(problem_group_id=problem_group_id)
-        except ProblemGroup.DoesNotExist:
+        # 問題グループ（完了日時を付与）・小問・ユーザーの回答を3クエリで取得する
+        # 小問・回答ともにレスポンスに使う列だけを取得する
+        # （prefetch の結合に使う外部キーも含める）
+        problem_group = (
+            ProblemGroup.objects.filter(problem_group_id=problem_group_id)
+            .annotate(
+                completed_at=Subquery(
+                    ProblemGroupAttempt.objects.filter(
+                        problem_group_id=OuterRef("problem_group_id"),
+                        user=request.user,
+                    ).values("created_at")[:1]
+                )
+            )
+            .prefetch_related(
+                Prefetch(
+                    "problems",
+                    queryset=Problem.objects.only(
+                        "problem_id",
+                        "problem_group_id",
+                        "problem_type",
+                        "order_index",
+                        "problem_body",
+                    ).order_by("order_index"),
+                ),
+                Prefetch(
+                    "problems__answers",
+                    queryset=Answer.objects.filter(user=request.user)
+                    .only(
+                        "answer_id", "problem_id", "answer_body", "grade", "created_at"
+                    )
+                    .order_by("-created_at"),
+                    to_attr="user_answers",
+                ),
+            )
+            .first()
+        )
+        if problem_group is None:
             raise NotFoundError(
                 error_code=ErrorCode.PROBLEM_NOT_FOUND,
                 message=f"問題グループID {problem_group_id} が見つかりません",
             )
 
         start_flag = request.query_params.get("start")
-        if start_flag == "true" and request.user.is_authenticated:
+        if start_flag == "true":
             request.session["current_problem_group_id"] = problem_group.problem_group_id
             request.session.modified = True
 
-        problems = list(problem_group.problems.all().order_by("order_index"))
-
-        problem_ids = [p.problem_id for p in problems]
-        all_user_answers = Answer.objects.filter(
-            problem_id__in=problem_ids,
-            user=request.user
-        ).order_by('problem_id', '-created_at')
-
-        grade_display_map = {0: "×", 1: "△", 2: "○"}
-        answers_by_problem = {pid: [] for pid in problem_ids}
+        problems = list(problem_group.problems.all())
 
-        for answer in all_user_answers:
-            answers_by_problem[answer.problem_id].append({
-                "answer_id": answer.answer_id,
-                "answer_body": answer.answer_body,
-                "grade": answer.grade,
-                "grade_display": grade_display_map.get(answer.grade, "×"),
-                "created_at": answer.created_at.isoformat(),
-            })
-
-        from .models import ProblemGroupAttempt
+        answers_by_problem = {
+            p.problem_id: [
+                {
+                    "answer_id": answer.answer_id,
+                    "answer_body": answer.answer_body,
+                    "grade": answer.grade,
+                    "grade_display": GRADE_DISPLAY_MAP.get(answer.grade, "×"),
+                    "created_at": answer.created_at.isoformat(),
+                }
+                for answer in p.user_answers
+            ]
+            for p in problems
+        }
 
-        attempt = ProblemGroupAttempt.objects.filter(
-            problem_group=problem_group, user=request.user
-        ).first()
-        completed_at = attempt.created_at.isoformat() if attempt else None
+        completed_at = (
+            problem_group.completed_at.isoformat()
+            if problem_group.completed_at
+            else None
+        )
 
         return Response(
             {
@@ -1112,20 +1342,31 @@ class RankingView(APIView):
                 message="limit は 1 から 100 の整数を指定してください"
             )
 
-        period = Period(period_str)
-        score_type = ScoreType(score_type_str)
+        # ランキングは全ユーザー共通のため、条件ごとに短時間キャッシュする
+        cache_key = f"ranking:{period_str}:{score_type_str}:{limit}"
+        rankings_data = cache.get(cache_key)
+        if rankings_data is None:
+            period = Period(period_str)
+            score_type = ScoreType(score_type_str)
 
-        rankings = get_ranking(period=period, score_type=score_type, limit=limit)
+            rankings = get_ranking(period=period, score_type=score_type, limit=limit)
 
-        rankings_data = [
-            {
-                "rank": entry.rank,
-                "user_id": entry.user_id,
-                "name": entry.name,
-                "score": entry.score,
-            }
-            for entry in rankings
-        ]
+            rankings_data = [
+                {
+                    "rank": entry.rank,
+                    "user_id": entry.user_id,
+                    "name": entry.name,
+                    "score": entry.score,
+                }
+                for entry in rankings
+            ]
+
+            timeout = RANKING_CACHE_TIMEOUT
+            period_end = get_period_end(period)
+            if period_end is not None:
+                seconds_left = int((period_end - timezone.now()).total_seconds())
+                timeout = max(1, min(timeout, seconds_left))
+            cache.set(cache_key, rankings_data, timeout=timeout)
 
         return Response(
             {
@@ -1181,10 +1422,6 @@ class DashboardView(APIView):
                 "error": null
             }
         """
-        from datetime import timedelta
-        from django.utils import timezone
-        from django.db.models import Avg, Count, Sum
-        from django.db.models.functions import TruncDate
 
         if not request.user.is_authenticated:
             raise PermissionDeniedError(
@@ -1193,75 +1430,74 @@ class DashboardView(APIView):
 
         user = request.user
 
-        # 1. 基本統計
-        user_answers = Answer.objects.filter(user=user)
-        total_answers = user_answers.count()
+        # 統計は回答時にしか変わらないため、短時間キャッシュする
+        # CACHES 未設定（プロセスごとの LocMemCache）では回答時に削除しても他のワーカーに
+        # 反映されないため、削除はせず有効期限のみで更新する（回答後最大60秒は古い統計を返す）
+        cache_key = _dashboard_cache_key(user.pk)
+        data = cache.get(cache_key)
+        if data is not None:
+            return Response({"data": data, "error": None}, status=status.HTTP_200_OK)
 
-        # 解いた題材数（ユニークな problem_group）
-        answered_problem_groups = (
-            user_answers.values("problem__problem_group").distinct().count()
+        # 1. 基本統計（回答数・解いた題材数・平均スコア・成績分布を1クエリで集計）
+        user_answers = Answer.objects.filter(user=user)
+        summary = user_answers.aggregate(
+            total=Count("answer_id"),
+            problem_groups=Count("problem__problem_group", distinct=True),
+            avg=Avg("grade"),
+            correct=Count("answer_id", filter=Q(grade=2)),
+            partial=Count("answer_id", filter=Q(grade=1)),
+            incorrect=Count("answer_id", filter=Q(grade=0)),
         )
+        total_answers = summary["total"]
+        answered_problem_groups = summary["problem_groups"]
+        avg_grade = summary["avg"] or 0
+        grade_distribution = {
+            "correct": summary["correct"],
+            "partial": summary["partial"],
+            "incorrect": summary["incorrect"],
+        }
 
-        # 平均スコア
-        avg_grade = user_answers.aggregate(avg=Avg("grade"))["avg"] or 0
-
-        # 成績分布
-        grade_counts = user_answers.values("grade").annotate(count=Count("grade"))
-        grade_distribution = {"correct": 0, "partial": 0, "incorrect": 0}
-        for gc in grade_counts:
-            if gc["grade"] == 2:
-                grade_distribution["correct"] = gc["count"]
-            elif gc["grade"] == 1:
-                grade_distribution["partial"] = gc["count"]
-            elif gc["grade"] == 0:
-                grade_distribution["incorrect"] = gc["count"]
-
-        # 2. 難易度別統計
-        difficulty_stats = {}
-        for diff in ["easy", "medium", "hard"]:
-            diff_answers = user_answers.filter(problem__problem_group__difficulty=diff)
-            count = diff_answers.count()
-            avg = diff_answers.aggregate(avg=Avg("grade"))["avg"] or 0
-            difficulty_stats[diff] = {
-                "count": count,
-                "average_grade": round(avg, 2),
+        # 2. 難易度別統計（難易度ごとの GROUP BY 1クエリで集計）
+        difficulty_stats = {
+            diff: {"count": 0, "average_grade": 0} for diff in DIFFICULTIES
+        }
+        difficulty_rows = (
+            user_answers.values("problem__problem_group__difficulty")
+            .annotate(count=Count("answer_id"), avg=Avg("grade"))
+            .order_by()
+        )
+        for row in difficulty_rows:
+            difficulty_stats[row["problem__problem_group__difficulty"]] = {
+                "count": row["count"],
+                "average_grade": round(row["avg"] or 0, 2),
             }
 
         # 3. ストリーク計算
-        # 日別のアクティビティを取得
-        daily_activity = (
+        # 回答のあった日付を昇順で取得し、1回の走査で連続日数を数える
+        activity_dates = (
             user_answers.annotate(date=TruncDate("created_at"))
-            .values("date")
+            .values_list("date", flat=True)
             .distinct()
-            .order_by("-date")
+            .order_by("date")
         )
-        activity_dates = set(d["date"] for d in daily_activity)
 
         today = timezone.now().date()
-        current_streak = 0
         longest_streak = 0
         temp_streak = 0
-
-        # 現在のストリークを計算（今日または昨日から連続している日数）
-        check_date = today
-        if check_date not in activity_dates:
-            check_date = today - timedelta(days=1)
-
-        while check_date in activity_dates:
-            current_streak += 1
-            check_date -= timedelta(days=1)
-
-        # 最長ストリークを計算
-        if activity_dates:
-            sorted_dates = sorted(activity_dates)
-            temp_streak = 1
-            for i in range(1, len(sorted_dates)):
-                if (sorted_dates[i] - sorted_dates[i - 1]).days == 1:
-                    temp_streak += 1
-                else:
-                    longest_streak = max(longest_streak, temp_streak)
-                    temp_streak = 1
-            longest_streak = max(longest_streak, temp_streak)
+        last_date = None
+        for activity_date in activity_dates:
+            if last_date is not None and activity_date - last_date == timedelta(days=1):
+                temp_streak += 1
+            else:
+                temp_streak = 1
+            if temp_streak > longest_streak:
+                longest_streak = temp_streak
+            last_date = activity_date
+
+        # 現在のストリーク（今日または昨日で終わる連続日数）は最後の連続区間の長さ
+        current_streak = 0
+        if last_date is not None and today - last_date <= timedelta(days=1):
+            current_streak = temp_streak
 
         # 4. カレンダーヒートマップ用データ（過去90日）
         ninety_days_ago = today - timedelta(days=90)
@@ -1269,33 +1505,33 @@ class DashboardView(APIView):
             user_answers.filter(created_at__date__gte=ninety_days_ago)
             .annotate(date=TruncDate("created_at"))
             .values("date")
-            .annotate(count=Count("answer_id"), grade_sum=Sum("grade"))
+            .annotate(count=Count("answer_id"), grade_sum=Coalesce(Sum("grade"), 0))
             .order_by("date")
+            .values_list("date", "count", "grade_sum")
         )
 
         activity_calendar = [
-            {
-                "date": entry["date"].isoformat(),
-                "count": entry["count"],
-                "grade_sum": entry["grade_sum"] or 0,
-            }
-            for entry in calendar_data
+            {"date": date.isoformat(), "count": count, "grade_sum": grade_sum}
+            for date, count, grade_sum in calendar_data
         ]
 
+        data = {
+            "total_problem_groups": answered_problem_groups,
+            "total_answers": total_answers,
+            "average_grade": round(avg_grade, 2),
+            "grade_distribution": grade_distribution,
+            "difficulty_stats": difficulty_stats,
+            "streak": {
+                "current": current_streak,
+                "longest": longest_streak,
+            },
+            "activity_calendar": activity_calendar,
+        }
+        cache.set(cache_key, data, timeout=DASHBOARD_CACHE_TIMEOUT)
+
         return Response(
             {
-                "data": {
-                    "total_problem_groups": answered_problem_groups,
-                    "total_answers": total_answers,
-                    "average_grade": round(avg_grade, 2),
-                    "grade_distribution": grade_distribution,
-                    "difficulty_stats": difficulty_stats,
-                    "streak": {
-                        "current": current_streak,
-                        "longest": longest_streak,
-                    },
-                    "activity_calendar": activity_calendar,
-                },
+                "data": data,
                 "error": None,
             },
             status=status.HTTP_200_OK,
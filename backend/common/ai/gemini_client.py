@@ -1,7 +1,15 @@
 import os
-from typing import Any, Optional
-from google import genai
-from google.genai import types
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Optional
+
+# google-genai は依存ライブラリ（httpx, pydantic 等）ごと読み込みが重いため、
+# 実際に API を呼び出すまでインポートしない（管理コマンドや LLM を使わないリクエストの起動を軽くする）
+if TYPE_CHECKING:
+    from google import genai
+    from google.genai import types
 
 
 class GeminiClientError(Exception):
@@ -10,6 +18,140 @@ class GeminiClientError(Exception):
     pass
 
 
+class _CircuitBreaker:
+    """
+    連続失敗時に一定時間 API 呼び出しを遮断するサーキットブレーカー
+
+    fail_max 回連続で失敗すると reset_timeout 秒間は即座に失敗させ、
+    その後1回だけ試行を許可する（成功すれば復帰、失敗すれば再度遮断）。
+    """
+
+    def __init__(self, fail_max: int, reset_timeout: float):
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._fail_count = 0
+        self._opened_at: Optional[float] = None
+        # 遮断後の試行リクエストが実行中かどうか（実行中は他の呼び出しを遮断する）
+        self._trial_in_flight = False
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_in_flight:
+                return False
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            # 試行を1回だけ許可し、結果が記録されるまで他の呼び出しは遮断する
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._fail_count = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """一時的な障害以外で試行が終わった場合に、次の呼び出しで再試行できるようにする"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self._trial_in_flight:
+                # 試行が失敗したら即座に再遮断する
+                self._trial_in_flight = False
+                self._opened_at = time.monotonic()
+                return
+            self._fail_count += 1
+            if self._fail_count >= self.fail_max:
+                self._opened_at = time.monotonic()
+
+
+# GeminiClient はリクエストごとに生成されるため、ブレーカーはプロセス内で共有する
+_circuit_breaker = _CircuitBreaker(fail_max=5, reset_timeout=60)
+
+
+def _is_timeout_error(e: Exception) -> bool:
+    """タイムアウトによる失敗かどうか"""
+    import httpx
+
+    # SDK は httpx の例外をそのまま送出するため、まず型で判定する
+    if isinstance(e, (httpx.TimeoutException, TimeoutError)):
+        return True
+    # SDK が別の例外に包んだ場合に備え、メッセージでも判定する
+    error_message = str(e).lower()
+    return "timeout" in error_message or "timed out" in error_message
+
+
+def _is_transient_error(e: Exception) -> bool:
+    """タイムアウト・5xx など一時的な失敗かどうか（サーキットブレーカーで数える）"""
+    from google.genai import errors as genai_errors
+
+    return isinstance(e, genai_errors.ServerError) or _is_timeout_error(e)
+
+
+def _is_retryable_error(e: Exception) -> bool:
+    """
+    再試行する失敗かどうか
+
+    タイムアウトは再試行すると1リクエストがタイムアウトの数倍ワーカーを占有するため、
+    再試行せずにすぐ失敗させる。
+    """
+    return _is_transient_error(e) and not _is_timeout_error(e)
+
+
+@lru_cache(maxsize=4)
+def _get_shared_client(api_key: str, timeout_ms: int) -> "genai.Client":
+    """
+    プロセス内で共有する genai.Client を取得する
+
+    GeminiClient はリクエストごとに生成されるため、genai.Client（内部の HTTP
+    コネクションプール）を共有して、TLS 接続をリクエスト間で使い回す。
+    genai.Client はスレッドセーフ。
+    """
+    from google import genai
+    from google.genai import types
+
+    return genai.Client(
+        api_key=api_key,
+        http_options=types.HttpOptions(timeout=timeout_ms),
+    )
+
+
+@lru_cache(maxsize=16)
+def _build_config(
+    temperature: float,
+    max_output_tokens: Optional[int],
+    response_format: Optional[str],
+    timeout_ms: Optional[int],
+) -> "types.GenerateContentConfig":
+    """
+    生成設定を組み立てる
+
+    呼び出し元ごとに使う組み合わせは数種類しかないため、同じ引数の設定は使い回す
+    （SDK は設定を読み取るだけで変更しない）。
+    """
+    from google.genai import types
+
+    config_params: dict[str, Any] = {
+        "temperature": temperature,
+    }
+
+    if max_output_tokens is not None:
+        config_params["max_output_tokens"] = max_output_tokens
+
+    if response_format is not None:
+        config_params["response_mime_type"] = response_format
+
+    if timeout_ms is not None:
+        config_params["http_options"] = types.HttpOptions(timeout=timeout_ms)
+
+    return types.GenerateContentConfig(**config_params)
+
+
 class GeminiClient:
     """
     Gemini API のクライアントクラス
@@ -19,6 +161,10 @@ class GeminiClient:
 
     タイムアウトはhttp_optionsを通じてリクエストレベルで適用されるため、
     タイムアウト後に不要なバックグラウンド処理が残ることはありません。
+
+    5xx エラーはジッター付きの指数バックオフで max_retries 回まで再試行します
+    （タイムアウトは再試行しません）。タイムアウト・5xx エラーが連続した場合は
+    サーキットブレーカーで呼び出しを遮断します。
     """
 
     def __init__(
@@ -26,6 +172,7 @@ class GeminiClient:
         api_key: Optional[str] = None,
         model: Optional[str] = None,
         default_timeout: int = 60,
+        max_retries: int = 2,
     ):
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
         if not self.api_key:
@@ -35,11 +182,9 @@ class GeminiClient:
 
         self.model = model or os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
         self.default_timeout = default_timeout
-        # デフォルトのHTTPオプションでクライアントを作成
-        self.client = genai.Client(
-            api_key=self.api_key,
-            http_options=types.HttpOptions(timeout=default_timeout * 1000),
-        )
+        self.max_retries = max_retries
+        # デフォルトのHTTPオプションのクライアントを、同じ設定の GeminiClient 間で共有する
+        self.client = _get_shared_client(self.api_key, default_timeout * 1000)
 
     def generate_content(
         self,
@@ -66,51 +211,62 @@ class GeminiClient:
         Raises:
             GeminiClientError: API呼び出しに失敗した場合
         """
-        try:
-            config_params: dict[str, Any] = {
-                "temperature": temperature,
-            }
+        if not _circuit_breaker.allow_request():
+            raise GeminiClientError(
+                "Gemini API の呼び出しが連続して失敗しているため、一時的に停止しています"
+            )
 
-            if max_output_tokens is not None:
-                config_params["max_output_tokens"] = max_output_tokens
+        # タイムアウトがデフォルト値と異なる場合はhttp_optionsを設定
+        timeout_ms = None
+        if timeout is not None and timeout != self.default_timeout:
+            timeout_ms = timeout * 1000
 
-            if response_format is not None:
-                config_params["response_mime_type"] = response_format
+        config = _build_config(
+            temperature, max_output_tokens, response_format, timeout_ms
+        )
 
-            # タイムアウトがデフォルト値と異なる場合はhttp_optionsを設定
-            if timeout is not None and timeout != self.default_timeout:
-                config_params["http_options"] = types.HttpOptions(
-                    timeout=timeout * 1000
+        attempt = 0
+        while True:
+            try:
+                # API呼び出し（タイムアウトはhttp_optionsで制御）
+                response = self.client.models.generate_content(
+                    model=self.model,
+                    contents=prompt,
+                    config=config,
                 )
+                break
+            except Exception as e:
+                if _is_retryable_error(e) and attempt < self.max_retries:
+                    # 再試行が一斉に集中しないようジッターを入れて待機する
+                    time.sleep(random.uniform(0.5, 1.5) * 2**attempt)
+                    attempt += 1
+                    continue
 
-            config = types.GenerateContentConfig(**config_params)
+                if _is_transient_error(e):
+                    _circuit_breaker.record_failure()
+                else:
+                    _circuit_breaker.release_trial()
 
-            # API呼び出し（タイムアウトはhttp_optionsで制御）
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt,
-                config=config,
-            )
+                # タイムアウトエラーの場合は分かりやすいメッセージに変換
+                if _is_timeout_error(e):
+                    effective_timeout = (
+                        timeout if timeout is not None else self.default_timeout
+                    )
+                    raise GeminiClientError(
+                        f"Gemini API の呼び出しがタイムアウトしました（{effective_timeout}秒）"
+                    ) from e
+                raise GeminiClientError(
+                    f"Gemini API の呼び出しに失敗しました: {e}"
+                ) from e
 
-            if not response.text:
-                raise GeminiClientError("生成されたテキストが空です")
+        _circuit_breaker.record_success()
 
-            return response.text
+        # response.text は呼び出しごとに parts を連結するプロパティのため1回だけ読む
+        text = response.text
+        if not text:
+            raise GeminiClientError("生成されたテキストが空です")
 
-        except GeminiClientError:
-            # 既にGeminiClientErrorの場合はそのまま再送出
-            raise
-        except Exception as e:
-            # タイムアウトエラーの場合は分かりやすいメッセージに変換
-            error_message = str(e).lower()
-            if "timeout" in error_message or "timed out" in error_message:
-                effective_timeout = (
-                    timeout if timeout is not None else self.default_timeout
-                )
-                raise GeminiClientError(
-                    f"Gemini API の呼び出しがタイムアウトしました（{effective_timeout}秒）"
-                ) from e
-            raise GeminiClientError(f"Gemini API の呼び出しに失敗しました: {e}") from e
+        return text
 
     def generate_json(
         self,
@@ -0,0 +1,96 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from .gemini_client import _CircuitBreaker
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    """_CircuitBreaker の状態遷移（closed → open → half-open → closed/open）"""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch(
+            "common.ai.gemini_client.time.monotonic", side_effect=lambda: self.now
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = _CircuitBreaker(fail_max=3, reset_timeout=60)
+
+    def _open(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+
+    def test_closed_allows_requests_below_fail_max(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_success_resets_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_opens_after_fail_max_consecutive_failures(self):
+        self._open()
+
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_rejects_until_reset_timeout_elapses(self):
+        self._open()
+        self.now += 59
+
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_half_open_allows_only_one_trial(self):
+        self._open()
+        self.now += 60
+
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_trial_success_closes(self):
+        self._open()
+        self.now += 60
+        self.breaker.allow_request()
+        self.breaker.record_success()
+
+        self.assertTrue(self.breaker.allow_request())
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_trial_success_resets_failure_count(self):
+        self._open()
+        self.now += 60
+        self.breaker.allow_request()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_trial_failure_reopens_immediately(self):
+        self._open()
+        self.now += 60
+        self.breaker.allow_request()
+        self.breaker.record_failure()
+
+        self.assertFalse(self.breaker.allow_request())
+        self.now += 59
+        self.assertFalse(self.breaker.allow_request())
+        self.now += 1
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_released_trial_allows_next_trial(self):
+        self._open()
+        self.now += 60
+        self.breaker.allow_request()
+        self.breaker.release_trial()
+
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
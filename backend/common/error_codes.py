@@ -5,6 +5,7 @@
 """
 
 from enum import Enum
+from typing import Union
 
 
 class ErrorCode(str, Enum):
@@ -73,60 +74,62 @@ class ErrorCode(str, Enum):
 
 
 # エラーコードに対応するデフォルトメッセージ
-ERROR_MESSAGES = {
+# キーは文字列値（ErrorCode のメンバーでも文字列でも同じ辞書を1回引くだけで済む）
+ERROR_MESSAGES: dict[str, str] = {
     # 汎用エラー
-    ErrorCode.INTERNAL_SERVER_ERROR: "内部サーバーエラーが発生しました",
-    ErrorCode.INVALID_REQUEST: "不正なリクエストです",
-    ErrorCode.VALIDATION_ERROR: "入力内容に誤りがあります",
+    ErrorCode.INTERNAL_SERVER_ERROR.value: "内部サーバーエラーが発生しました",
+    ErrorCode.INVALID_REQUEST.value: "不正なリクエストです",
+    ErrorCode.VALIDATION_ERROR.value: "入力内容に誤りがあります",
     # 認証・認可エラー
-    ErrorCode.UNAUTHORIZED: "認証が必要です",
-    ErrorCode.FORBIDDEN: "アクセス権限がありません",
-    ErrorCode.INVALID_CREDENTIALS: "メールアドレスまたはパスワードが正しくありません",
-    ErrorCode.EMAIL_ALREADY_EXISTS: "このメールアドレスは既に登録されています",
-    ErrorCode.SESSION_EXPIRED: "セッションの有効期限が切れました",
+    ErrorCode.UNAUTHORIZED.value: "認証が必要です",
+    ErrorCode.FORBIDDEN.value: "アクセス権限がありません",
+    ErrorCode.INVALID_CREDENTIALS.value: "メールアドレスまたはパスワードが正しくありません",
+    ErrorCode.EMAIL_ALREADY_EXISTS.value: "このメールアドレスは既に登録されています",
+    ErrorCode.SESSION_EXPIRED.value: "セッションの有効期限が切れました",
     # リソースエラー
-    ErrorCode.NOT_FOUND: "リソースが見つかりません",
-    ErrorCode.RESOURCE_NOT_FOUND: "指定されたリソースが見つかりません",
-    ErrorCode.PROBLEM_GROUP_NOT_FOUND: "問題グループが見つかりません",
-    ErrorCode.PROBLEM_NOT_FOUND: "問題が見つかりません",
-    ErrorCode.ANSWER_NOT_FOUND: "回答が見つかりません",
+    ErrorCode.NOT_FOUND.value: "リソースが見つかりません",
+    ErrorCode.RESOURCE_NOT_FOUND.value: "指定されたリソースが見つかりません",
+    ErrorCode.PROBLEM_GROUP_NOT_FOUND.value: "問題グループが見つかりません",
+    ErrorCode.PROBLEM_NOT_FOUND.value: "問題が見つかりません",
+    ErrorCode.ANSWER_NOT_FOUND.value: "回答が見つかりません",
     # ゲスト制限エラー
-    ErrorCode.GUEST_LIMIT_REACHED: "ゲストユーザーの利用上限に達しました。続けるにはログインしてください",
-    ErrorCode.GUEST_ALREADY_GENERATED: "ゲストユーザーは1問のみ生成できます",
-    ErrorCode.GUEST_TOKEN_INVALID: "無効なゲストトークンです",
-    ErrorCode.GUEST_TOKEN_REQUIRED: "ゲストトークンが必要です",
-    ErrorCode.GUEST_SESSION_NOT_FOUND: "ゲストセッションが見つかりません",
-    ErrorCode.GUEST_TOKEN_MISMATCH: "ゲストトークンが一致しません",
+    ErrorCode.GUEST_LIMIT_REACHED.value: "ゲストユーザーの利用上限に達しました。続けるにはログインしてください",
+    ErrorCode.GUEST_ALREADY_GENERATED.value: "ゲストユーザーは1問のみ生成できます",
+    ErrorCode.GUEST_TOKEN_INVALID.value: "無効なゲストトークンです",
+    ErrorCode.GUEST_TOKEN_REQUIRED.value: "ゲストトークンが必要です",
+    ErrorCode.GUEST_SESSION_NOT_FOUND.value: "ゲストセッションが見つかりません",
+    ErrorCode.GUEST_TOKEN_MISMATCH.value: "ゲストトークンが一致しません",
     # ビジネスロジックエラー
-    ErrorCode.INVALID_DIFFICULTY: "無効な難易度が指定されました",
-    ErrorCode.INVALID_APP_SCALE: "無効なアプリ規模が指定されました",
-    ErrorCode.INVALID_MODE: "無効なモードが指定されました",
-    ErrorCode.INVALID_PROBLEM_TYPE: "無効な問題種別が指定されました",
-    ErrorCode.INVALID_GRADE: "無効な評価が指定されました",
-    ErrorCode.INVALID_INPUT_COMBINATION: "入力の組み合わせが無効です",
-    ErrorCode.MISSING_PROBLEM_ID: "問題IDが必要です",
-    ErrorCode.MISSING_GUEST_INFO: "ゲスト情報が必要です",
-    ErrorCode.MISSING_ANSWER_BODY: "回答本文が必要です",
-    ErrorCode.ANSWER_BODY_TOO_LONG: "回答本文が長すぎます",
-    ErrorCode.PROBLEM_IN_PROGRESS: "進行中の問題があります。先に完了してください",
-    ErrorCode.AI_GENERATION_FAILED: "問題生成に失敗しました",
-    ErrorCode.AI_GRADING_FAILED: "採点処理に失敗しました",
-    ErrorCode.GENERATION_ERROR: "生成処理でエラーが発生しました",
-    ErrorCode.GRADING_ERROR: "採点処理でエラーが発生しました",
-    ErrorCode.PERMISSION_DENIED: "この操作を実行する権限がありません",
+    ErrorCode.INVALID_DIFFICULTY.value: "無効な難易度が指定されました",
+    ErrorCode.INVALID_APP_SCALE.value: "無効なアプリ規模が指定されました",
+    ErrorCode.INVALID_MODE.value: "無効なモードが指定されました",
+    ErrorCode.INVALID_PROBLEM_TYPE.value: "無効な問題種別が指定されました",
+    ErrorCode.INVALID_GRADE.value: "無効な評価が指定されました",
+    ErrorCode.INVALID_INPUT_COMBINATION.value: "入力の組み合わせが無効です",
+    ErrorCode.MISSING_PROBLEM_ID.value: "問題IDが必要です",
+    ErrorCode.MISSING_GUEST_INFO.value: "ゲスト情報が必要です",
+    ErrorCode.MISSING_ANSWER_BODY.value: "回答本文が必要です",
+    ErrorCode.ANSWER_BODY_TOO_LONG.value: "回答本文が長すぎます",
+    ErrorCode.PROBLEM_IN_PROGRESS.value: "進行中の問題があります。先に完了してください",
+    ErrorCode.AI_GENERATION_FAILED.value: "問題生成に失敗しました",
+    ErrorCode.AI_GRADING_FAILED.value: "採点処理に失敗しました",
+    ErrorCode.GENERATION_ERROR.value: "生成処理でエラーが発生しました",
+    ErrorCode.GRADING_ERROR.value: "採点処理でエラーが発生しました",
+    ErrorCode.PERMISSION_DENIED.value: "この操作を実行する権限がありません",
     # CSRF/セキュリティエラー
-    ErrorCode.CSRF_TOKEN_MISSING: "CSRFトークンが見つかりません",
-    ErrorCode.CSRF_TOKEN_INVALID: "CSRFトークンが無効です",
+    ErrorCode.CSRF_TOKEN_MISSING.value: "CSRFトークンが見つかりません",
+    ErrorCode.CSRF_TOKEN_INVALID.value: "CSRFトークンが無効です",
 }
 
 
-def get_error_message(code: ErrorCode) -> str:
+def get_error_message(code: Union[ErrorCode, str]) -> str:
     """エラーコードに対応するデフォルトメッセージを取得する.
 
     Args:
-        code: エラーコード
+        code: エラーコード（ErrorCode またはその文字列値）
 
     Returns:
         str: デフォルトエラーメッセージ
     """
+    # ErrorCode は str を継承しているため、メンバーのまま文字列キーで引ける
     return ERROR_MESSAGES.get(code, "エラーが発生しました")
@@ -5,7 +5,7 @@ DRFのデフォルト例外ハンドラーをカスタマイズし、
 """
 
 import logging
-from typing import Any
+from typing import Any, Callable
 
 from django.core.exceptions import PermissionDenied
 from django.http import Http404
@@ -13,6 +13,7 @@ from rest_framework import exceptions as drf_exceptions
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import exception_handler as drf_exception_handler
+from rest_framework.views import set_rollback
 
 from .error_codes import ErrorCode, get_error_message
 from .exceptions import AppException
@@ -21,6 +22,17 @@ from .validators import format_validation_errors, get_first_validation_error
 
 logger = logging.getLogger(__name__)
 
+# メッセージが例外の内容に依存しない例外 → (エラーコード, HTTPステータス)
+# サブクラスは _DRF_EXCEPTION_HANDLERS 側で処理する
+_STATIC_ERRORS: dict[type, tuple[ErrorCode, int]] = {
+    drf_exceptions.NotAuthenticated: (
+        ErrorCode.UNAUTHORIZED,
+        status.HTTP_401_UNAUTHORIZED,
+    ),
+    Http404: (ErrorCode.NOT_FOUND, status.HTTP_404_NOT_FOUND),
+    PermissionDenied: (ErrorCode.FORBIDDEN, status.HTTP_403_FORBIDDEN),
+}
+
 
 def custom_exception_handler(exc: Exception, context: dict[str, Any]) -> Response:
     """カスタム例外ハンドラー.
@@ -44,30 +56,40 @@ def custom_exception_handler(exc: Exception, context: dict[str, Any]) -> Respons
             status=exc.status_code,
         )
 
-    # 2. DRFの標準例外処理を実行
+    # 2. 内容が例外クラスだけで決まる例外はDRFの処理を経由せずに返す
+    static_error = _STATIC_ERRORS.get(type(exc))
+    if static_error is not None:
+        error_code, status_code = static_error
+        # DRF の例外処理と同様に、ATOMIC_REQUESTS 時のトランザクションをロールバックさせる
+        set_rollback()
+        return error_response(
+            code=error_code.value,
+            message=get_error_message(error_code),
+            status=status_code,
+        )
+
+    # 3. DRFの標準例外処理を実行
+    # （Django の Http404 / PermissionDenied も DRF が処理してレスポンスを返す）
     response = drf_exception_handler(exc, context)
 
-    # 3. DRFが処理できた例外を統一形式に変換
+    # 4. DRFが処理できた例外を統一形式に変換
     if response is not None:
         return _handle_drf_exception(exc, response)
 
-    # 4. Django標準例外の処理
-    if isinstance(exc, Http404):
-        return error_response(
-            code=ErrorCode.NOT_FOUND.value,
-            message=get_error_message(ErrorCode.NOT_FOUND),
-            status=status.HTTP_404_NOT_FOUND,
-        )
-
-    if isinstance(exc, PermissionDenied):
-        return error_response(
-            code=ErrorCode.FORBIDDEN.value,
-            message=get_error_message(ErrorCode.FORBIDDEN),
-            status=status.HTTP_403_FORBIDDEN,
-        )
-
     # 5. 未処理の例外（500エラー）
-    logger.exception("Unhandled exception occurred", exc_info=exc)
+    request = context.get("request")
+    view = context.get("view")
+    logger.error(
+        "Unhandled exception occurred: %s",
+        type(exc).__name__,
+        exc_info=exc,
+        extra={
+            "exc_type": type(exc).__name__,
+            "method": getattr(request, "method", None),
+            "path": getattr(request, "path", None),
+            "view": type(view).__name__ if view is not None else None,
+        },
+    )
     return error_response(
         code=ErrorCode.INTERNAL_SERVER_ERROR.value,
         message=get_error_message(ErrorCode.INTERNAL_SERVER_ERROR),
@@ -78,6 +100,9 @@ def custom_exception_handler(exc: Exception, context: dict[str, Any]) -> Respons
 def _handle_drf_exception(exc: Exception, response: Response) -> Response:
     """DRFの標準例外を統一形式に変換する.
 
+    例外クラスで変換関数を引き、登録されていないサブクラスの場合のみ
+    isinstance で親クラスの変換関数を探します。
+
     Args:
         exc: 発生した例外
         response: DRFが生成したレスポンス
@@ -85,67 +110,117 @@ def _handle_drf_exception(exc: Exception, response: Response) -> Response:
     Returns:
         Response: 統一エラー形式のレスポンス
     """
-    # バリデーションエラー
-    if isinstance(exc, drf_exceptions.ValidationError):
-        return error_response(
-            code=ErrorCode.VALIDATION_ERROR.value,
-            message=get_first_validation_error(response.data),
-            details=format_validation_errors(response.data),
-            status=response.status_code,
-        )
+    handler = _DRF_EXCEPTION_HANDLERS.get(type(exc))
+    if handler is None:
+        handler = _handle_other_drf_exception
+        for exc_class, candidate in _DRF_EXCEPTION_HANDLERS.items():
+            if isinstance(exc, exc_class):
+                handler = candidate
+                break
+    return handler(exc, response)
+
+
+def _handle_validation_error(exc: Exception, response: Response) -> Response:
+    """バリデーションエラー."""
+    return error_response(
+        code=ErrorCode.VALIDATION_ERROR.value,
+        message=get_first_validation_error(response.data),
+        details=format_validation_errors(response.data),
+        status=response.status_code,
+    )
 
-    # 認証エラー（未ログイン）
-    if isinstance(exc, drf_exceptions.NotAuthenticated):
-        return error_response(
-            code=ErrorCode.UNAUTHORIZED.value,
-            message=get_error_message(ErrorCode.UNAUTHORIZED),
-            status=status.HTTP_401_UNAUTHORIZED,
-        )
 
-    # 認可エラー（権限不足）
-    if isinstance(exc, drf_exceptions.PermissionDenied):
-        return error_response(
-            code=ErrorCode.FORBIDDEN.value,
-            message=str(exc) if str(exc) else get_error_message(ErrorCode.FORBIDDEN),
-            status=status.HTTP_403_FORBIDDEN,
-        )
+def _handle_not_authenticated(exc: Exception, response: Response) -> Response:
+    """認証エラー（未ログイン）."""
+    return error_response(
+        code=ErrorCode.UNAUTHORIZED.value,
+        message=get_error_message(ErrorCode.UNAUTHORIZED),
+        status=status.HTTP_401_UNAUTHORIZED,
+    )
 
-    # リソース未検出
-    if isinstance(exc, drf_exceptions.NotFound):
-        return error_response(
-            code=ErrorCode.NOT_FOUND.value,
-            message=str(exc) if str(exc) else get_error_message(ErrorCode.NOT_FOUND),
-            status=status.HTTP_404_NOT_FOUND,
-        )
 
-    # 不正なリクエスト
-    if isinstance(exc, drf_exceptions.ParseError):
-        return error_response(
-            code=ErrorCode.INVALID_REQUEST.value,
-            message=str(exc) if str(exc) else "リクエストの形式が正しくありません",
-            status=status.HTTP_400_BAD_REQUEST,
-        )
+def _handle_permission_denied(exc: Exception, response: Response) -> Response:
+    """認可エラー（権限不足）."""
+    return error_response(
+        code=ErrorCode.FORBIDDEN.value,
+        message=str(exc) if str(exc) else get_error_message(ErrorCode.FORBIDDEN),
+        status=status.HTTP_403_FORBIDDEN,
+    )
 
-    # メソッド不許可
-    if isinstance(exc, drf_exceptions.MethodNotAllowed):
-        return error_response(
-            code=ErrorCode.INVALID_REQUEST.value,
-            message=f"メソッド {exc.detail} は許可されていません",
-            status=status.HTTP_405_METHOD_NOT_ALLOWED,
-        )
 
-    # スロットリング
-    if isinstance(exc, drf_exceptions.Throttled):
-        return error_response(
-            code=ErrorCode.INVALID_REQUEST.value,
-            message="リクエストが多すぎます。しばらく待ってから再試行してください",
-            details={"retry_after": exc.wait},
-            status=status.HTTP_429_TOO_MANY_REQUESTS,
-        )
+def _handle_not_found(exc: Exception, response: Response) -> Response:
+    """リソース未検出."""
+    return error_response(
+        code=ErrorCode.NOT_FOUND.value,
+        message=str(exc) if str(exc) else get_error_message(ErrorCode.NOT_FOUND),
+        status=status.HTTP_404_NOT_FOUND,
+    )
+
+
+def _handle_django_not_found(exc: Exception, response: Response) -> Response:
+    """Django の Http404（メッセージはデフォルトのものを使う）."""
+    return error_response(
+        code=ErrorCode.NOT_FOUND.value,
+        message=get_error_message(ErrorCode.NOT_FOUND),
+        status=status.HTTP_404_NOT_FOUND,
+    )
+
+
+def _handle_django_permission_denied(exc: Exception, response: Response) -> Response:
+    """Django の PermissionDenied（メッセージはデフォルトのものを使う）."""
+    return error_response(
+        code=ErrorCode.FORBIDDEN.value,
+        message=get_error_message(ErrorCode.FORBIDDEN),
+        status=status.HTTP_403_FORBIDDEN,
+    )
+
+
+def _handle_parse_error(exc: Exception, response: Response) -> Response:
+    """不正なリクエスト."""
+    return error_response(
+        code=ErrorCode.INVALID_REQUEST.value,
+        message=str(exc) if str(exc) else "リクエストの形式が正しくありません",
+        status=status.HTTP_400_BAD_REQUEST,
+    )
+
+
+def _handle_method_not_allowed(exc: Exception, response: Response) -> Response:
+    """メソッド不許可."""
+    return error_response(
+        code=ErrorCode.INVALID_REQUEST.value,
+        message=f"メソッド {exc.detail} は許可されていません",
+        status=status.HTTP_405_METHOD_NOT_ALLOWED,
+    )
+
 
-    # その他のDRF例外
+def _handle_throttled(exc: Exception, response: Response) -> Response:
+    """スロットリング."""
+    return error_response(
+        code=ErrorCode.INVALID_REQUEST.value,
+        message="リクエストが多すぎます。しばらく待ってから再試行してください",
+        details={"retry_after": exc.wait},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+    )
+
+
+def _handle_other_drf_exception(exc: Exception, response: Response) -> Response:
+    """その他のDRF例外."""
     return error_response(
         code=ErrorCode.INVALID_REQUEST.value,
         message=str(exc) if str(exc) else get_error_message(ErrorCode.INVALID_REQUEST),
         status=response.status_code,
     )
+
+
+# 例外クラス → 変換関数
+_DRF_EXCEPTION_HANDLERS: dict[type, Callable[[Exception, Response], Response]] = {
+    drf_exceptions.ValidationError: _handle_validation_error,
+    drf_exceptions.NotAuthenticated: _handle_not_authenticated,
+    drf_exceptions.PermissionDenied: _handle_permission_denied,
+    drf_exceptions.NotFound: _handle_not_found,
+    drf_exceptions.ParseError: _handle_parse_error,
+    drf_exceptions.MethodNotAllowed: _handle_method_not_allowed,
+    drf_exceptions.Throttled: _handle_throttled,
+    Http404: _handle_django_not_found,
+    PermissionDenied: _handle_django_permission_denied,
+}
@@ -4,7 +4,7 @@ DRF（Django REST Framework）のバリデーションエラーを
 統一レスポンス形式に変換する機能を提供します。
 """
 
-from typing import Any
+from typing import Any, Iterator
 
 
 def format_validation_errors(errors: Any) -> dict[str, list[str]]:
@@ -69,19 +69,33 @@ def _flatten_nested_errors(nested_errors: dict[str, Any]) -> list[str]:
     Returns:
         list[str]: フラット化されたエラーメッセージリスト
     """
-    messages = []
-    for key, value in nested_errors.items():
-        if isinstance(value, list):
-            for item in value:
+    return list(_iter_nested_errors(nested_errors))
+
+
+def _iter_nested_errors(nested_errors: dict[str, Any]) -> Iterator[str]:
+    """ネストされたバリデーションエラーのメッセージを出現順に返す.
+
+    Args:
+        nested_errors: ネストされたエラー辞書
+
+    Yields:
+        str: "キー: メッセージ" 形式のエラーメッセージ
+    """
+    # 再帰せずスタックで辿る（出現順を保つため逆順に積んで末尾から取り出す）
+    stack = list(reversed(nested_errors.items()))
+    while stack:
+        key, value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(reversed(value.items()))
+        elif isinstance(value, list):
+            for item in reversed(value):
                 if isinstance(item, dict):
-                    messages.extend(_flatten_nested_errors(item))
+                    stack.extend(reversed(item.items()))
                 else:
-                    messages.append(f"{key}: {str(item)}")
-        elif isinstance(value, dict):
-            messages.extend(_flatten_nested_errors(value))
+                    # リスト内のリストは展開せず、文字列にしてそのまま出力する
+                    stack.append((key, str(item)))
         else:
-            messages.append(f"{key}: {str(value)}")
-    return messages
+            yield f"{key}: {value}"
 
 
 def get_first_validation_error(errors: Any) -> str:
@@ -89,6 +103,7 @@ def get_first_validation_error(errors: Any) -> str:
 
     複数のフィールドでエラーが発生した場合、最初のエラーメッセージのみを返します。
     これは、シンプルなエラー表示が必要な場合に使用します。
+    format_validation_errors と同じ順序で探し、最初のメッセージが見つかった時点で返します。
 
     Args:
         errors: DRFのserializer.errorsオブジェクト（dict/list/str）
@@ -96,8 +111,22 @@ def get_first_validation_error(errors: Any) -> str:
     Returns:
         str: 最初のエラーメッセージ
     """
-    formatted = format_validation_errors(errors)
-    for field_errors in formatted.values():
-        if field_errors:
-            return field_errors[0]
+    if isinstance(errors, list):
+        if errors:
+            return str(errors[0])
+    elif isinstance(errors, str):
+        return errors
+    elif isinstance(errors, dict):
+        for error_list in errors.values():
+            if isinstance(error_list, list):
+                if error_list:
+                    return str(error_list[0])
+            elif isinstance(error_list, dict):
+                first = next(_iter_nested_errors(error_list), None)
+                if first is not None:
+                    return first
+            else:
+                return str(error_list)
+    else:
+        return str(errors)
     return "入力内容に誤りがあります"
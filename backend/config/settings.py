@@ -280,7 +280,36 @@ SESSION_COOKIE_AGE = 1209600
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 
 # セッションの保存先（デフォルトはデータベース）
+# セッションは1リクエストにつき最初のアクセス時に1回だけ読み込まれる。
+# 共有キャッシュ（Redis など）を CACHES に設定した場合は
+# "django.contrib.sessions.backends.cached_db" に切り替えると読み込みの DB アクセスを省ける。
+# プロセスごとの LocMemCache のままで cached_db にすると、ワーカー間で
+# 古いセッションを読むおそれがあるため切り替えないこと。
 SESSION_ENGINE = "django.contrib.sessions.backends.db"
 
 # セッションをリクエストごとに保存する（アクティビティ検知用）
 SESSION_SAVE_EVERY_REQUEST = False
+
+
+# ========================================
+# AI Grading
+# ========================================
+# 一括採点時に Gemini へ並列で送る採点リクエスト数
+# 1 の場合は全問をまとめて1回の一括採点リクエストで送る
+GRADER_CONCURRENCY = int(os.environ.get("GRADER_CONCURRENCY", "1"))
+
+
+# ========================================
+# N+1 Query Detection (development)
+# ========================================
+# 開発時に nplusone がインストールされていれば、N+1 クエリを検出して警告する
+# NPLUSONE_RAISE=True にすると警告ではなく例外にする
+if DEBUG:
+    try:
+        import nplusone  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        INSTALLED_APPS.append("nplusone.ext.django")
+        MIDDLEWARE.insert(0, "nplusone.ext.django.NPlusOneMiddleware")
+        NPLUSONE_RAISE = os.environ.get("NPLUSONE_RAISE", "False") == "True"